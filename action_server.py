@@ -0,0 +1,177 @@
+# mccfr_engine/action_server.py
+"""
+Локальный сервер действий поверх MCCFREngine.
+
+Протокол — JSON по строкам через unix-сокет (или TCP на localhost):
+  {"id": ..., "state": GameState.to_dict()}  ->  {"id": ..., "action": [[[card, [row, idx]], ...], discard] | null}
+  {"id": ..., "op": "stats"}                 ->  {"id": ..., "stats": {...}}
+  при ошибке                                 ->  {"id": ..., "error": "..."}
+Ответы одного соединения могут приходить не в порядке запросов — сопоставляются по id.
+
+Запросы всех соединений попадают в одну очередь. Батчер берёт первый запрос, добирает
+остальные не дольше max_delay (и не больше max_batch) и решает всю пачку одним вызовом
+engine.get_actions, поэтому задержка под нагрузкой ограничена max_delay + временем пачки.
+"""
+import argparse
+import asyncio
+import json
+import socket
+from dataclasses import asdict
+from typing import List, Optional
+
+from engine_api import MCCFREngine
+from ofc_game import GameState
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_DELAY = 0.001   # секунд ожидания добора пачки
+
+class ActionServer:
+    def __init__(self, engine: MCCFREngine, max_batch: int = DEFAULT_MAX_BATCH, max_delay: float = DEFAULT_MAX_DELAY):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.batched_requests = 0
+        self._queue: Optional[asyncio.Queue] = None
+
+    def stats(self) -> dict:
+        return dict(asdict(self.engine.stats), batches=self.batches,
+                    mean_batch=self.batched_requests / self.batches if self.batches else 0.0)
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batcher(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                actions = self.engine.get_actions([state for state, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            for (_, future), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(action)
+
+    async def _respond(self, writer: asyncio.StreamWriter, request_id, future) -> None:
+        try:
+            response = {'id': request_id, 'action': await future}
+        except Exception as e:
+            response = {'id': request_id, 'error': str(e)}
+        writer.write(json.dumps(response).encode() + b'\n')
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        try:
+            async for line in reader:
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get('id')
+                    if request.get('op') == 'stats':
+                        writer.write(json.dumps({'id': request_id, 'stats': self.stats()}).encode() + b'\n')
+                        continue
+                    state = GameState.from_dict(request['state'])
+                except Exception as e:
+                    # Любой разбор запроса, включая неожиданные исключения from_dict, отвечает
+                    # ошибкой этому запросу и не рвёт соединение с его запросами в работе
+                    writer.write(json.dumps({'id': request_id, 'error': f"Bad request: {e}"}).encode() + b'\n')
+                    continue
+                future = loop.create_future()
+                await self._queue.put((state, future))
+                task = asyncio.create_task(self._respond(writer, request_id, future))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def serve(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0) -> None:
+        """Обслуживает unix-сокет path (или TCP host:port) до отмены."""
+        self._queue = asyncio.Queue()
+        batcher = asyncio.create_task(self._batcher())
+        if path:
+            server = await asyncio.start_unix_server(self._handle, path=path)
+        else:
+            server = await asyncio.start_server(self._handle, host=host, port=port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+class ActionClient:
+    """Блокирующий клиент для ботов: одно соединение, запросы по очереди."""
+
+    def __init__(self, path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0):
+        if path:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.connect(path)
+        else:
+            self._sock = socket.create_connection((host, port))
+        self._file = self._sock.makefile('rwb')
+        self._next_id = 0
+
+    def _call(self, request: dict) -> dict:
+        self._next_id += 1
+        request['id'] = self._next_id
+        self._file.write(json.dumps(request).encode() + b'\n')
+        self._file.flush()
+        response = json.loads(self._file.readline())
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    def get_action(self, state: GameState):
+        action = self._call({'state': state.to_dict()})['action']
+        if action is None:
+            return None
+        placement, discard = action
+        return tuple((c, (row, idx)) for c, (row, idx) in placement), discard
+
+    def stats(self) -> dict:
+        return self._call({'op': 'stats'})['stats']
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Локальный сервер действий MCCFR с микробатчингом")
+    parser.add_argument('strategy')
+    parser.add_argument('--socket', default=None, help="путь unix-сокета (иначе TCP)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH)
+    parser.add_argument('--max-delay', type=float, default=DEFAULT_MAX_DELAY)
+    args = parser.parse_args(argv)
+
+    server = ActionServer(MCCFREngine(args.strategy), args.max_batch, args.max_delay)
+    try:
+        asyncio.run(server.serve(args.socket, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+# mccfr_engine/benchmark.py
+"""
+Бенчмарки движка.
+
+terminal    — подсчёт терминалов: прежний многопроходный подсчёт (multipass_payoffs, базовая
+              линия), эталонный однопроходный evaluator.calculate_payoffs на Board и нативный
+              GameState.get_payoffs (с кешем рядов hand_eval и без него).
+primitives  — get_legal_actions, apply_action, get_infoset_key и get_infoset_hash на
+              состояниях посреди раздачи.
+traversal   — run_iterations по режимам сэмплирования на пустой таблице: узлов и терминалов
+              в секунду, рост таблицы по ходу обучения, байт на инфосет (ячейка индекса и блок
+              арены узла) и отдельно ёмкость таблицы. В сборке с OFC_INSTRUMENT=1 добавляются
+              узлы по улицам и разбивка времени по фазам. Полный обход (full) не замеряется:
+              одна его итерация на дереве OFC не заканчивается за разумное время.
+
+Все наборы строятся на сидированных раздачах и воспроизводимы при том же --seed.
+Результаты пишутся в JSON (--output); --compare сравнивает их с сохранённым прогоном
+и завершается с кодом 1, если метрика ухудшилась больше чем на --threshold.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+import evaluator
+import hand_eval
+import mccfr
+import ofc_game
+from infoset_table import InfosetTable
+from ofc_game import GameState
+
+SUITES = ('terminal', 'primitives', 'traversal')
+TRAVERSAL_MODES = ('outcome', 'external')
+DEFAULT_TRAVERSAL_ITERATIONS = {'outcome': 2000, 'external': 2}
+GROWTH_STEPS = 10          # замеров размера таблицы за прогон обхода
+DEFAULT_THRESHOLD = 0.05   # допустимое ухудшение метрики при --compare
+
+def multipass_payoffs(board_p1, board_p2):
+    """
+    Прежний calculate_payoffs — базовая линия набора terminal: фол, линии и роялти
+    считаются отдельными проходами, каждый ряд оценивается несколько раз.
+    """
+    def total_royalty(board):
+        return sum(evaluator.get_row_royalty(board.get_row_cards(row), row) for row in evaluator.ROW_NAMES)
+
+    p1_foul = board_p1.is_foul()
+    p2_foul = board_p2.is_foul()
+    if p1_foul and p2_foul: return 0.0, 0.0
+    if p1_foul: return -float(evaluator.SCOOP_BONUS + total_royalty(board_p2)), float(evaluator.SCOOP_BONUS + total_royalty(board_p2))
+    if p2_foul: return float(evaluator.SCOOP_BONUS + total_royalty(board_p1)), -float(evaluator.SCOOP_BONUS + total_royalty(board_p1))
+
+    line_score_p1 = 0
+    for row in evaluator.ROW_NAMES:
+        p1_rank, _, _ = evaluator.get_hand_rank(board_p1.get_row_cards(row))
+        p2_rank, _, _ = evaluator.get_hand_rank(board_p2.get_row_cards(row))
+        if p1_rank < p2_rank: line_score_p1 += 1
+        elif p1_rank > p2_rank: line_score_p1 -= 1
+
+    if abs(line_score_p1) == 3: line_score_p1 += evaluator.SCOOP_BONUS if line_score_p1 > 0 else -evaluator.SCOOP_BONUS
+
+    total_score_p1 = line_score_p1 + (board_p1.get_total_royalty() - board_p2.get_total_royalty())
+    return float(total_score_p1), float(-total_score_p1)
+
+def sample_terminals(count: int, seed: int = 0) -> List[GameState]:
+    """count терминальных состояний, доигранных случайными легальными действиями."""
+    rng = random.Random(seed)
+    ofc_game.seed_deals(seed)
+    terminals = []
+    while len(terminals) < count:
+        state = GameState()
+        while not state.is_terminal():
+            actions = state.get_legal_actions()
+            state.apply_action_inplace(rng.choice(actions) if actions else None)
+        terminals.append(state)
+    return terminals
+
+def sample_decisions(count: int, seed: int = 0) -> List[GameState]:
+    """count состояний с легальными действиями, взятых со всех улиц случайных доигровок."""
+    rng = random.Random(seed)
+    ofc_game.seed_deals(seed)
+    states = []
+    while len(states) < count:
+        state = GameState()
+        while not state.is_terminal() and len(states) < count:
+            actions = state.get_legal_actions()
+            if actions:
+                states.append(state)
+                state = state.apply_action(rng.choice(actions))
+            else:
+                state.apply_action_inplace(None)
+    return states
+
+def _rate(fn: Callable[[], None], count: int, repeats: int, setup: Optional[Callable[[], None]] = None) -> float:
+    # Лучшая из repeats скорость, вызовов в секунду; setup (сброс кешей) выполняется вне замера
+    best = float('inf')
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return count / best if best > 0 else float('inf')
+
+def bench_terminal(count: int = 20000, repeats: int = 5, seed: int = 0,
+                   leaves_per_deal: int = 8) -> Dict[str, float]:
+    """
+    Терминалов в секунду для каждого пути подсчёта. Каждый терминал повторяется
+    leaves_per_deal раз подряд — как соседние листья одной раздачи в обходе.
+    """
+    states = [s for s in sample_terminals(max(1, count // leaves_per_deal), seed) for _ in range(leaves_per_deal)]
+    boards = [s.boards for s in states]
+    n = len(states)
+
+    def multipass():
+        for b in boards:
+            multipass_payoffs(b[0], b[1])
+
+    def reference():
+        for b in boards:
+            evaluator.calculate_payoffs(b[0], b[1])
+
+    def native():
+        for s in states:
+            s.get_payoffs()
+
+    results = {'terminals': n, 'multipass_per_sec': _rate(multipass, n, repeats),
+               'reference_per_sec': _rate(reference, n, repeats, evaluator._row_result.cache_clear)}
+    # clear_row_cache пересоздаёт кеш (~3 МБ) — это не часть подсчёта терминалов
+    hand_eval.configure_row_cache(0)
+    results['native_uncached_per_sec'] = _rate(native, n, repeats, hand_eval.clear_row_cache)
+    hand_eval.configure_row_cache()
+    results['native_per_sec'] = _rate(native, n, repeats, hand_eval.clear_row_cache)
+    stats = hand_eval.row_cache_stats()
+    results['row_cache_hit_rate'] = stats['hits'] / max(1, stats['hits'] + stats['misses'])
+    return results
+
+def bench_primitives(count: int = 20000, repeats: int = 5, seed: int = 0) -> Dict[str, float]:
+    """Вызовов в секунду для операций над GameState, которые использует Python-API движка."""
+    states = sample_decisions(count, seed)
+    actions = [s.get_legal_actions()[0] for s in states]
+    n = len(states)
+
+    def legal_actions():
+        for s in states:
+            s.get_legal_actions()
+
+    def apply_action():
+        for s, a in zip(states, actions):
+            s.apply_action(a)
+
+    def infoset_key():
+        for s in states:
+            s.get_infoset_key()
+
+    def infoset_hash():
+        for s in states:
+            s.get_infoset_hash()
+
+    return {'states': n,
+            'legal_actions_per_sec': _rate(legal_actions, n, repeats),
+            'apply_action_per_sec': _rate(apply_action, n, repeats),
+            'infoset_key_per_sec': _rate(infoset_key, n, repeats),
+            'infoset_hash_per_sec': _rate(infoset_hash, n, repeats)}
+
+def bench_traversal(mode: str, iterations: int, seed: int = 0) -> Dict:
+    """
+    Один прогон run_iterations на пустой локальной таблице. growth — число инфосетов
+    после каждой из GROWTH_STEPS частей прогона.
+    """
+    if mode not in TRAVERSAL_MODES:
+        raise ValueError(f"Traversal benchmark supports {TRAVERSAL_MODES}, got {mode!r}")
+    table = InfosetTable()
+    # Раздачи и сэмплирование — один генератор xorshift64*: сиды берутся разные, как у воркеров тренера
+    deal_seed, sampler_seed = (int(x) for x in np.random.SeedSequence(seed).generate_state(2, dtype=np.uint64))
+    ofc_game.seed_deals(deal_seed)
+    mccfr.seed_sampler(sampler_seed)
+    mccfr.reset_counters()
+    steps = min(GROWTH_STEPS, iterations)
+    bounds = [iterations * (i + 1) // steps for i in range(steps)]
+    growth = []
+    done, seconds = 0, 0.0
+    for bound in bounds:
+        start = time.perf_counter()
+        mccfr.run_iterations(table, bound - done, mode, done)
+        seconds += time.perf_counter() - start
+        done = bound
+        growth.append(len(table))
+
+    stats = mccfr.instrument_stats()
+    results = {'iterations': iterations, 'seconds': seconds,
+               'iterations_per_sec': iterations / seconds,
+               'nodes': stats['nodes'], 'nodes_per_sec': stats['nodes'] / seconds,
+               'terminals': stats['terminals'], 'terminals_per_sec': stats['terminals'] / seconds,
+               'infosets': len(table), 'infosets_per_iteration': len(table) / iterations,
+               'bytes_per_infoset': table.node_bytes / max(1, len(table)),
+               'capacity': table.capacity, 'reserved_bytes': table.nbytes,
+               'growth': growth}
+    if stats['instrumented']:
+        results['nodes_by_street'] = stats['nodes_by_street']
+        results['phase_seconds'] = stats['seconds']
+    return results
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(suites=SUITES, modes=TRAVERSAL_MODES, count: int = 20000, repeats: int = 5,
+                   seed: int = 0, iterations: Optional[int] = None) -> Dict:
+    """Прогоняет наборы suites; результат сериализуется в JSON как есть."""
+    results = {'meta': {'commit': _git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'python': platform.python_version(), 'numpy': np.__version__,
+                        'instrumented': mccfr.INSTRUMENTED, 'seed': seed, 'count': count, 'repeats': repeats}}
+    if 'terminal' in suites:
+        results['terminal'] = bench_terminal(count, repeats, seed)
+    if 'primitives' in suites:
+        results['primitives'] = bench_primitives(count, repeats, seed)
+    if 'traversal' in suites:
+        results['traversal'] = {mode: bench_traversal(mode, iterations or DEFAULT_TRAVERSAL_ITERATIONS[mode], seed)
+                                for mode in modes}
+    return results
+
+def _metrics(results: Dict, prefix: str = '') -> Dict[str, float]:
+    # Сравниваемые метрики: скорости (*_per_sec, больше — лучше) и bytes_per_infoset (меньше — лучше)
+    out = {}
+    for name, value in results.items():
+        if name == 'meta':
+            continue
+        path = f"{prefix}{name}"
+        if isinstance(value, dict):
+            out.update(_metrics(value, path + '.'))
+        elif name.endswith('_per_sec') or name == 'bytes_per_infoset':
+            out[path] = float(value)
+    return out
+
+def compare_results(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """Строки сравнения по общим метрикам; regression — ухудшение больше threshold."""
+    base, cur = _metrics(baseline), _metrics(current)
+    rows = []
+    for path in sorted(base.keys() & cur.keys()):
+        change = cur[path] / base[path] - 1.0 if base[path] else 0.0
+        worse = -change if path.endswith('_per_sec') else change
+        rows.append({'metric': path, 'baseline': base[path], 'current': cur[path],
+                     'change': change, 'regression': worse > threshold})
+    return rows
+
+def _print_results(results: Dict) -> None:
+    meta = results['meta']
+    print(f"commit {meta['commit']}, seed {meta['seed']}, instrumented: {meta['instrumented']}")
+    if 'terminal' in results:
+        r = results['terminal']
+        print(f"terminal ({r['terminals']} терминалов):")
+        for name in ('multipass', 'reference', 'native_uncached', 'native'):
+            rate = r.get(f'{name}_per_sec')
+            if rate is not None:
+                print(f"  {name:16s} {rate:14,.0f} терм./с  x{rate / r.get('multipass_per_sec', rate):.1f}")
+        print(f"  попаданий в кеш рядов: {r['row_cache_hit_rate']:.1%}")
+    if 'primitives' in results:
+        r = results['primitives']
+        print(f"primitives ({r['states']} состояний):")
+        for name in ('legal_actions', 'apply_action', 'infoset_key', 'infoset_hash'):
+            print(f"  {name:16s} {r[f'{name}_per_sec']:14,.0f} выз./с")
+    for mode, r in results.get('traversal', {}).items():
+        print(f"traversal {mode} ({r['iterations']} итераций, {r['seconds']:.2f}s):")
+        print(f"  {r['nodes_per_sec']:14,.0f} узлов/с  {r['terminals_per_sec']:14,.0f} терм./с  "
+              f"{r['iterations_per_sec']:.1f} it/s")
+        print(f"  инфосетов: {r['infosets']} ({r['infosets_per_iteration']:.1f}/итерацию), "
+              f"{r['bytes_per_infoset']:.1f} байт/инфосет")
+        if 'capacity' in r:
+            print(f"  ёмкость индекса: {r['capacity']} ячеек, выделено {r['reserved_bytes'] / 2**20:.1f} МБ")
+        if 'nodes_by_street' in r:
+            print("  узлов по улицам: " + ", ".join(f"{k}: {v}" for k, v in r['nodes_by_street'].items()))
+            print("  время: " + ", ".join(f"{k} {v:.3f}s ({v / r['seconds']:.0%})" for k, v in r['phase_seconds'].items()))
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки MCCFR-движка OFC")
+    parser.add_argument('--suites', default=','.join(SUITES), help="через запятую: " + ', '.join(SUITES))
+    parser.add_argument('--modes', default=','.join(TRAVERSAL_MODES), help="режимы обхода для traversal: "
+                        + ', '.join(TRAVERSAL_MODES))
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=None, help="итераций обхода на режим")
+    parser.add_argument('--output', default=None, help="записать результаты в JSON")
+    parser.add_argument('--compare', default=None, help="JSON прошлого прогона для сравнения")
+    parser.add_argument('--current', default=None, help="сравнить этот JSON вместо нового прогона")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    suites = [s for s in args.suites.split(',') if s]
+    modes = [m for m in args.modes.split(',') if m]
+    for name in suites:
+        if name not in SUITES:
+            parser.error(f"unknown suite: {name}")
+    for mode in modes:
+        if mode not in TRAVERSAL_MODES:
+            parser.error(f"unsupported traversal mode: {mode} (full-width traversal does not finish on OFC)")
+
+    if args.current:
+        with open(args.current) as f:
+            results = json.load(f)
+    else:
+        results = run_benchmarks(suites, modes, args.count, args.repeats, args.seed, args.iterations)
+        _print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('instrumented') != results['meta'].get('instrumented'):
+            print("Внимание: прогоны собраны с разным OFC_INSTRUMENT")
+        rows = compare_results(baseline, results, args.threshold)
+        print(f"сравнение с {baseline['meta'].get('commit')}:")
+        for row in rows:
+            mark = '  РЕГРЕССИЯ' if row['regression'] else ''
+            print(f"  {row['metric']:45s} {row['baseline']:14,.1f} -> {row['current']:14,.1f}  {row['change']:+7.1%}{mark}")
+        regressions = sum(row['regression'] for row in rows)
+        if regressions:
+            parser.exit(1, f"{regressions} метрик ухудшились больше чем на {args.threshold:.0%}\n")
+
+if __name__ == '__main__':
+    main()
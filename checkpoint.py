@@ -0,0 +1,207 @@
+# mccfr_engine/checkpoint.py
+"""
+Чекпоинты обучения MCCFR.
+
+Каталог чекпоинта:
+  manifest.json      — файлы таблицы по порядку (полный снимок + инкременты), шаги
+                       дисконтирования перед инкрементами и состояние тренера: счётчик
+                       итераций, состояния ГСЧ воркеров, параметры обучения
+  full-NNNNNN.ckpt   — все узлы таблицы
+  delta-NNNNNN.ckpt  — узлы, которых касались обходы с прошлого чекпоинта (значения целиком)
+
+Файл таблицы: FILE_HEADER, затем куски CHUNK_HEADER + keys uint64[n] + counts uint32[n] +
+values float32[floats] (regret_sum и strategy_sum узлов подряд). Таблица выгружается по
+CHUNK_SLOTS ячеек индекса, поэтому запись не строит вторую копию таблицы. Файлы и манифест
+пишутся во временные файлы и атомарно переименовываются: сбой посреди записи оставляет
+предыдущий чекпоинт целым, а флаги изменённых узлов снимаются только после записи.
+
+Дисконтирование (InfosetTable.discount) меняет все узлы, но не помечает их изменёнными:
+манифест хранит коэффициенты шагов, применённых до каждого инкремента ('discounts'), и
+load/compact применяют их к узлам более старых файлов — так инкремент после шага
+дисконтирования не становится копией всей таблицы.
+"""
+import json
+import os
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from infoset_table import InfosetTable
+
+MAGIC = b'OFCCKPT\0'
+FORMAT_VERSION = 1
+KIND_FULL, KIND_DELTA = 0, 1
+FILE_HEADER = struct.Struct('<8sIIQ')   # magic, version, kind, число узлов
+CHUNK_HEADER = struct.Struct('<QQ')     # число узлов, число float
+CHUNK_SLOTS = 1 << 16                   # ячеек индекса на кусок
+MANIFEST = 'manifest.json'
+DEFAULT_COMPACT_AFTER = 8               # инкрементов до слияния в полный снимок
+
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+Discount = Sequence[float]   # (regret_pos, regret_neg, strategy) — аргументы InfosetTable.discount
+
+class _TableWriter:
+    # Пишет куски во временный файл; close() дописывает число узлов и переименовывает файл
+    def __init__(self, path: str, kind: int):
+        self.path = path
+        self.kind = kind
+        self.records = 0
+        self._f = open(path + '.tmp', 'wb')
+        self._f.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, kind, 0))
+
+    def write(self, keys: np.ndarray, counts: np.ndarray, values: np.ndarray) -> None:
+        if len(keys) == 0:
+            return
+        self._f.write(CHUNK_HEADER.pack(len(keys), len(values)))
+        keys.astype('<u8', copy=False).tofile(self._f)
+        counts.astype('<u4', copy=False).tofile(self._f)
+        values.astype('<f4', copy=False).tofile(self._f)
+        self.records += len(keys)
+
+    def close(self) -> int:
+        self._f.seek(0)
+        self._f.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, self.kind, self.records))
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.close()
+        os.replace(self.path + '.tmp', self.path)
+        return self.records
+
+def write_table(table: InfosetTable, path: str, dirty_only: bool = False, chunk_slots: int = CHUNK_SLOTS) -> int:
+    """Потоково пишет узлы таблицы (все или только изменённые); возвращает их число."""
+    writer = _TableWriter(path, KIND_DELTA if dirty_only else KIND_FULL)
+    for start in range(0, table.capacity, chunk_slots):
+        writer.write(*table.export_chunk(start, start + chunk_slots, dirty_only))
+    return writer.close()
+
+def read_table(path: str) -> Iterator[Chunk]:
+    """Куски (keys, counts, values) файла таблицы."""
+    with open(path, 'rb') as f:
+        magic, version, _, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not a checkpoint file: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {version} in {path}")
+        while True:
+            head = f.read(CHUNK_HEADER.size)
+            if not head:
+                return
+            n, floats = CHUNK_HEADER.unpack(head)
+            keys = np.fromfile(f, dtype='<u8', count=n)
+            counts = np.fromfile(f, dtype='<u4', count=n)
+            values = np.fromfile(f, dtype='<f4', count=floats)
+            if len(values) != floats:
+                raise ValueError(f"Truncated checkpoint file: {path}")
+            yield keys, counts, values
+
+def discount_values(counts: np.ndarray, values: np.ndarray, steps: Sequence[Discount]) -> np.ndarray:
+    """Применяет шаги дисконтирования к values записей файла так же, как InfosetTable.discount."""
+    if not steps:
+        return values
+    n = counts.astype(np.int64)
+    starts = np.repeat(np.cumsum(2 * n) - 2 * n, 2 * n)
+    regret = np.arange(len(values)) - starts < np.repeat(n, 2 * n)
+    for regret_pos, regret_neg, strategy in steps:
+        factor = np.where(regret, np.where(values > 0, np.float32(regret_pos), np.float32(regret_neg)),
+                          np.float32(strategy))
+        values = values * factor
+    return values
+
+class CheckpointStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def manifest(self) -> Optional[dict]:
+        try:
+            with open(self._path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _commit(self, manifest: dict, previous: Optional[dict]) -> None:
+        tmp = self._path(MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(MANIFEST))
+        # Файлы, на которые больше не ссылается манифест, удаляются только после его замены
+        for name in set(previous['files'] if previous else ()) - set(manifest['files']):
+            os.remove(self._path(name))
+
+    @property
+    def deltas(self) -> int:
+        manifest = self.manifest()
+        return max(0, len(manifest['files']) - 1) if manifest else 0
+
+    def save(self, table: InfosetTable, state: dict, full: bool = False, discounts: Sequence[Discount] = ()) -> dict:
+        """
+        Пишет чекпоинт: полный снимок (первый раз или full=True) либо инкремент из изменённых
+        узлов; state — состояние тренера для возобновления, discounts — шаги дисконтирования
+        таблицы с прошлого чекпоинта. Снимает пометки dirty.
+        """
+        previous = self.manifest()
+        full = full or previous is None
+        sequence = (previous['sequence'] if previous else 0) + 1
+        name = f"{'full' if full else 'delta'}-{sequence:06d}.ckpt"
+        write_table(table, self._path(name), dirty_only=not full)
+        if full:
+            files, steps = [name], {}
+        else:
+            files, steps = previous['files'] + [name], dict(previous.get('discounts', {}))
+            if discounts:
+                steps[name] = [list(d) for d in discounts]
+        manifest = {'version': FORMAT_VERSION, 'sequence': sequence, 'files': files, 'discounts': steps, 'state': state}
+        self._commit(manifest, previous)
+        table.clear_dirty()
+        return manifest
+
+    def load(self, table: InfosetTable) -> dict:
+        """Загружает снимок и инкременты в table по порядку; возвращает состояние тренера."""
+        manifest = self.manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No checkpoint in {self.directory}")
+        steps = manifest.get('discounts', {})
+        for name in manifest['files']:
+            # Шаги перед инкрементом применяются к уже загруженным узлам; узлы инкремента их уже содержат
+            for step in steps.get(name, ()):
+                table.discount(*step)
+            for keys, counts, values in read_table(self._path(name)):
+                table.load_records(keys, counts, values)
+        table.clear_dirty()
+        return manifest['state']
+
+    def compact(self) -> dict:
+        """
+        Сливает снимок и инкременты в новый полный снимок: файлы читаются от новых к старым,
+        узел берётся из самого нового файла, к нему применяются шаги дисконтирования всех более
+        новых файлов. В памяти держатся только ключи уже записанных узлов.
+        """
+        previous = self.manifest()
+        if previous is None:
+            raise FileNotFoundError(f"No checkpoint in {self.directory}")
+        sequence = previous['sequence'] + 1
+        name = f"full-{sequence:06d}.ckpt"
+        writer = _TableWriter(self._path(name), KIND_FULL)
+        steps = previous.get('discounts', {})
+        seen = np.empty(0, dtype=np.uint64)
+        later: List[Discount] = []   # шаги после записи текущего файла, по порядку
+        for old in reversed(previous['files']):
+            written = []
+            for keys, counts, values in read_table(self._path(old)):
+                pos = np.minimum(np.searchsorted(seen, keys), max(len(seen) - 1, 0))
+                fresh = seen[pos] != keys if len(seen) else np.ones(len(keys), dtype=bool)
+                values = values[np.repeat(fresh, 2 * counts.astype(np.int64))]
+                writer.write(keys[fresh], counts[fresh], discount_values(counts[fresh], values, later))
+                written.append(keys[fresh])
+            seen = np.sort(np.concatenate([seen] + written))
+            later = list(steps.get(old, ())) + later
+        writer.close()
+        manifest = dict(previous, sequence=sequence, files=[name], discounts={})
+        self._commit(manifest, previous)
+        return manifest
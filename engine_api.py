@@ -1,44 +1,110 @@
-# mccfr_engine/engine_api.py
-import pickle
-import numpy as np
+# mccfr_engine/engine_api.py (v4 - распределения стратегии для оценки)
 import random
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from ofc_game import GameState
+from strategy_io import StrategyIndex, build_index, load_strategy
 
-from ofc_game import GameState 
-from card import Card
+DEFAULT_DECISION_CACHE = 1 << 16   # инфосетов в LRU-кеше решений
+
+@dataclass
+class EngineStats:
+    requests: int = 0            # состояний с хотя бы одним легальным действием
+    cache_hits: int = 0
+    cache_misses: int = 0
+    unknown_infosets: int = 0    # инфосета нет в профиле — случайное действие
+    size_mismatches: int = 0     # длина стратегии != числу легальных действий — случайное действие
 
 class MCCFREngine:
-    def __init__(self, strategy_path: str):
+    def __init__(self, strategy_path: str, cache_size: int = DEFAULT_DECISION_CACHE):
         try:
-            with open(strategy_path, 'rb') as f:
-                self.strategy_profile = pickle.load(f)
+            # Бинарный формат strategy_io открывается через mmap; pickle-профиль нормируется один раз здесь
+            profile = load_strategy(strategy_path)
+            self.strategy_profile = profile if isinstance(profile, StrategyIndex) else build_index(profile)
             print(f"Движок MCCFR успешно загружен. {len(self.strategy_profile)} инфосетов.")
         except FileNotFoundError:
             print(f"Ошибка: Файл стратегии не найден по пути {strategy_path}")
-            self.strategy_profile = {}
+            self.strategy_profile = build_index({})
+        self.cache_size = cache_size
+        self._decisions = OrderedDict()   # хеш инфосета -> (индекс лучшего действия или -1, длина стратегии)
+        self.stats = EngineStats()
+
+    def _decide(self, position: int):
+        if position < 0:
+            return -1, 0
+        strategy = self.strategy_profile.strategy_at(position)
+        return int(np.argmax(strategy)), len(strategy)
+
+    def _remember(self, key: int, decision) -> None:
+        self._decisions[key] = decision
+        if len(self._decisions) > self.cache_size:
+            self._decisions.popitem(last=False)
+
+    def get_actions(self, states: Sequence[GameState]) -> List:
+        """Действия для пачки состояний: ключи разрешаются одним поиском, решения кешируются по инфосету."""
+        return self._choose(states, [s.get_legal_actions() for s in states])
+
+    def get_action_codes(self, states: Sequence[GameState]) -> List:
+        """Как get_actions, но возвращает коды GameState.get_legal_action_codes (без построения кортежей)."""
+        return self._choose(states, [s.get_legal_action_codes() for s in states])
+
+    def get_strategies(self, states: Sequence[GameState]) -> List[Optional[np.ndarray]]:
+        """
+        Вероятности действий средней стратегии в порядке get_legal_action_codes; None — инфосета
+        нет в профиле или длина стратегии не совпадает с числом легальных действий.
+        """
+        positions = self.strategy_profile.find_hashes(np.array([s.get_infoset_hash() for s in states], dtype=np.uint64))
+        strategies = []
+        for s, position in zip(states, positions):
+            strategy = self.strategy_profile.strategy_at(int(position)) if position >= 0 else None
+            if strategy is not None and len(strategy) != len(s.get_legal_action_codes()):
+                strategy = None
+            strategies.append(strategy)
+        return strategies
+
+    def _choose(self, states: Sequence[GameState], legal: List[list]) -> List:
+        # legal[i] — легальные действия состояния i в порядке стратегии (кортежи или коды)
+        keys = [s.get_infoset_hash() for s in states]
+        decisions = [None] * len(states)
+        pending = []
+        for i, key in enumerate(keys):
+            if not legal[i]:
+                continue
+            self.stats.requests += 1
+            decision = self._decisions.get(key)
+            if decision is None:
+                self.stats.cache_misses += 1
+                pending.append(i)
+            else:
+                self.stats.cache_hits += 1
+                self._decisions.move_to_end(key)
+                decisions[i] = decision
+
+        if pending:
+            positions = self.strategy_profile.find_hashes(np.array([keys[i] for i in pending], dtype=np.uint64))
+            for i, position in zip(pending, positions):
+                decisions[i] = self._decide(int(position))
+                self._remember(keys[i], decisions[i])
+
+        actions = []
+        for i, decision in enumerate(decisions):
+            if decision is None:
+                actions.append(None)
+                continue
+            best, size = decision
+            if best < 0:
+                self.stats.unknown_infosets += 1
+                actions.append(random.choice(legal[i]))
+            elif size != len(legal[i]):
+                self.stats.size_mismatches += 1
+                actions.append(random.choice(legal[i]))
+            else:
+                actions.append(legal[i][best])
+        return actions
 
     def get_action(self, current_game_state: GameState):
-        player_id = current_game_state.current_player
-        infoset_key = current_game_state.get_infoset_key(player_id)
-        legal_actions = current_game_state.get_legal_actions()
-        
-        if not legal_actions: return None
-
-        if infoset_key not in self.strategy_profile:
-            print(f"Warning: Infoset not found. Choosing random action. Key: {infoset_key}")
-            return random.choice(legal_actions)
-
-        node_info = self.strategy_profile[infoset_key]
-        strategy = node_info['strategy_sum']
-        
-        if len(strategy) != len(legal_actions):
-             print(f"Warning: Strategy length mismatch. Choosing random action. Strategy: {len(strategy)}, Actions: {len(legal_actions)}")
-             return random.choice(legal_actions)
-
-        total_sum = np.sum(strategy)
-        if total_sum > 0:
-            normalized_strategy = strategy / total_sum
-        else:
-            normalized_strategy = np.ones(len(legal_actions)) / len(legal_actions)
-
-        best_action_index = np.argmax(normalized_strategy)
-        return legal_actions[best_action_index]
+        return self.get_actions([current_game_state])[0]
@@ -0,0 +1,288 @@
+# mccfr_engine/evaluate.py
+"""
+Оценка обученной стратегии без живой игры.
+
+head_to_head       — агент A против агента B на сидированных раздачах в пуле процессов.
+                     Каждая раздача играется дважды с той же колодой, A на месте 0 и на
+                     месте 1 (общие случайные числа + смена мест): удача раздачи и места
+                     вычитается, и выборка — среднее по паре. Выигрыш считает
+                     evaluator.calculate_payoffs, доверительный интервал — нормальный по парам.
+local_best_response — выборочный локальный лучший ответ (LBR) против стратегии: в каждом
+                     своём ходе LBR перебирает кандидатов, доигрывает каждого в rollouts
+                     мирах (скрытые карты — сброс оппонента и колода — пересэмплированы из
+                     того, что LBR не видит), далее обе стороны играют по стратегии, и
+                     выбирает лучшего. Средний выигрыш LBR — оценка снизу эксплуатируемости
+                     (игра симметрична со сменой мест, её цена — 0).
+
+Агент задаётся строкой: 'random', 'heuristic' или путь к файлу стратегии (MCCFREngine).
+Эвристика оценивает ряды после хода (GameState.rank_actions) и штрафует нарушение порядка рядов,
+по которому calculate_payoffs засчитывает фол.
+Агенты ходят пакетно через get_action_codes: партии пачки идут в ногу, и стратегия
+разрешает все состояния одного игрока одним вызовом. Раздачи определяются (seed, номер),
+поэтому результат не зависит от числа воркеров.
+"""
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import evaluator
+from engine_api import MCCFREngine
+from ofc_game import GameState
+
+AGENT_KINDS = ('random', 'heuristic')   # иначе — путь к файлу стратегии
+FOUL_PENALTY = 0.001         # очков за единицу ранга, на которую ряды нарушают порядок фола
+DEFAULT_CHUNK = 256          # раздач на задание пула
+DEFAULT_LBR_ACTIONS = 16     # кандидатов LBR на ход (0 — все легальные)
+DEFAULT_LBR_ROLLOUTS = 8     # миров на кандидата
+Z_95 = 1.959963984540054
+
+def deal_seed(seed: int, i: int) -> int:
+    """Сид i-й раздачи прогона (splitmix64 от seed и i, никогда не 0)."""
+    x = (seed * 0x9E3779B97F4A7C15 + i + 1) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (x ^ (x >> 31)) or 1
+
+class RandomAgent:
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+
+    def get_action_codes(self, states: Sequence[GameState]) -> List:
+        actions = []
+        for s in states:
+            codes = s.get_legal_action_codes()
+            actions.append(self.rng.choice(codes) if codes else None)
+        return actions
+
+class HeuristicAgent:
+    """
+    Жадный агент: ход, после которого роялти рядов выше, а ряды дальше от фола. Штраф —
+    FOUL_PENALTY за каждую единицу ранга, на которую top сильнее middle или middle сильнее
+    bottom (сравнение рангов то же, что в evaluator.calculate_payoffs). Оценка —
+    GameState.rank_actions: ходы применяются на месте, ряды считаются через кеш hand_eval.
+    """
+
+    @staticmethod
+    def ranked(state: GameState) -> List[int]:
+        """Индексы get_legal_action_codes() по убыванию оценки (при равенстве — по порядку)."""
+        return state.rank_actions(FOUL_PENALTY)
+
+    def get_action_codes(self, states: Sequence[GameState]) -> List:
+        actions = []
+        for s in states:
+            codes = s.get_legal_action_codes()
+            actions.append(codes[self.ranked(s)[0]] if codes else None)
+        return actions
+
+_ENGINES: Dict[str, Tuple[tuple, MCCFREngine]] = {}   # путь -> (версия файла, движок); грузятся один раз
+
+def make_agent(spec: str, seed: int = 0):
+    if spec == 'random':
+        return RandomAgent(seed)
+    if spec == 'heuristic':
+        return HeuristicAgent()
+    if not os.path.exists(spec):
+        raise FileNotFoundError(f"Strategy file not found: {spec}")
+    st = os.stat(spec)
+    version = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _ENGINES.get(spec)
+    if cached is None or cached[0] != version:
+        # Файл перезаписан (например, новым чекпоинтом) — загружаем заново
+        _ENGINES[spec] = cached = (version, MCCFREngine(spec))
+    return cached[1]
+
+def play_out(states: List[GameState], agents: Sequence) -> None:
+    """Доигрывает states на месте; agents[p] ходит за игрока p пакетом на шаг."""
+    active = [s for s in states if not s.is_terminal()]
+    while active:
+        for p, agent in enumerate(agents):
+            group = [s for s in active if s.current_player == p]
+            if group:
+                for s, code in zip(group, agent.get_action_codes(group)):
+                    s.apply_action_inplace(code)
+        active = [s for s in active if not s.is_terminal()]
+
+def score(state: GameState) -> Tuple[float, float]:
+    return evaluator.calculate_payoffs(*state.boards)
+
+@dataclass
+class EvalResult:
+    deals: int
+    mean: float                 # выигрыш оцениваемого агента за раздачу (среднее по двум местам)
+    stderr: float
+    ci_low: float               # 95% доверительный интервал
+    ci_high: float
+    seat_means: Tuple[float, float]
+    seconds: float
+
+    @property
+    def deals_per_sec(self) -> float:
+        return self.deals / self.seconds if self.seconds > 0 else 0.0
+
+# Частичные суммы задания: (пар, сумма, сумма квадратов, сумма на месте 0, сумма на месте 1)
+Moments = Tuple[int, float, float, float, float]
+
+def _result(parts: List[Moments], seconds: float) -> EvalResult:
+    n = sum(p[0] for p in parts)
+    if n == 0:
+        raise ValueError("No deals evaluated")
+    total, squares = sum(p[1] for p in parts), sum(p[2] for p in parts)
+    mean = total / n
+    variance = max(0.0, squares / n - mean * mean) * n / (n - 1) if n > 1 else 0.0
+    stderr = math.sqrt(variance / n)
+    return EvalResult(n, mean, stderr, mean - Z_95 * stderr, mean + Z_95 * stderr,
+                      (sum(p[3] for p in parts) / n, sum(p[4] for p in parts) / n), seconds)
+
+def _run_chunks(fn, tasks: List[tuple], workers: int) -> List[Moments]:
+    if workers <= 1:
+        return [fn(task) for task in tasks]
+    with mp.get_context('fork').Pool(workers) as pool:
+        return list(pool.imap(fn, tasks))   # по порядку: суммы воспроизводимы до бита
+
+def _chunks(deals: int, chunk: int) -> List[Tuple[int, int]]:
+    return [(start, min(chunk, deals - start)) for start in range(0, deals, chunk)]
+
+# --- Матч ---
+def _match_chunk(task: tuple) -> Moments:
+    spec_a, spec_b, seed, start, count = task
+    random.seed(deal_seed(seed ^ 0x5EED, start))   # случайный выбор MCCFREngine на неизвестных инфосетах
+    a = make_agent(spec_a, deal_seed(seed ^ 0xA, start))
+    b = make_agent(spec_b, deal_seed(seed ^ 0xB, start))
+    first = [GameState(seed=deal_seed(seed, i)) for i in range(start, start + count)]
+    second = [GameState(seed=deal_seed(seed, i)) for i in range(start, start + count)]
+    play_out(first, (a, b))
+    play_out(second, (b, a))
+    total = squares = seat0 = seat1 = 0.0
+    for x, y in zip(first, second):
+        u0, u1 = score(x)[0], score(y)[1]
+        u = (u0 + u1) / 2
+        total += u
+        squares += u * u
+        seat0 += u0
+        seat1 += u1
+    return count, total, squares, seat0, seat1
+
+def head_to_head(spec_a: str, spec_b: str, deals: int, seed: int = 0, workers: Optional[int] = None,
+                 chunk: int = DEFAULT_CHUNK) -> EvalResult:
+    """Выигрыш агента spec_a против spec_b за раздачу (со сменой мест)."""
+    start = time.perf_counter()
+    tasks = [(spec_a, spec_b, seed, s, n) for s, n in _chunks(deals, chunk)]
+    parts = _run_chunks(_match_chunk, tasks, workers or os.cpu_count() or 1)
+    return _result(parts, time.perf_counter() - start)
+
+# --- Локальный лучший ответ ---
+def _resample_world(state: GameState, player: int, rng: random.Random) -> GameState:
+    # Скрытое от player (сброс оппонента и порядок колоды) перемешивается заново
+    d = state.to_dict()
+    opponent = 1 - player
+    hidden = list(d['discards'][opponent]) + list(d['deck'])
+    rng.shuffle(hidden)
+    k = len(d['discards'][opponent])
+    d['discards'][opponent] = hidden[:k]
+    d['deck'] = hidden[k:]
+    return GameState.from_dict(d)
+
+def _lbr_action(state: GameState, policy, rng: random.Random, max_actions: int, rollouts: int):
+    codes = state.get_legal_action_codes()
+    if len(codes) <= 1:
+        return codes[0] if codes else None
+    candidates = codes
+    if max_actions and len(codes) > max_actions:
+        # Кандидаты — ход самой стратегии, половина — её самые вероятные действия, остальное — лучшие по эвристике
+        keep = {codes.index(policy.get_action_codes([state])[0])}
+        probs = policy.get_strategies([state])[0] if isinstance(policy, MCCFREngine) else None
+        if probs is not None:
+            keep.update(int(i) for i in np.argsort(-probs, kind='stable')[:max_actions // 2])
+        for i in HeuristicAgent.ranked(state):
+            if len(keep) >= max_actions:
+                break
+            keep.add(i)
+        candidates = [codes[i] for i in sorted(keep)]
+
+    player = state.current_player
+    worlds = [_resample_world(state, player, rng) for _ in range(rollouts)]
+    sims = []
+    for code in candidates:
+        for world in worlds:
+            sim = GameState(from_state=world)
+            sim.apply_action_inplace(code)
+            sims.append(sim)
+    play_out(sims, (policy, policy))
+    values = [sum(score(sims[i * rollouts + r])[player] for r in range(rollouts)) for i in range(len(candidates))]
+    return candidates[max(range(len(candidates)), key=values.__getitem__)]
+
+def _lbr_chunk(task: tuple) -> Moments:
+    spec, seed, start, count, max_actions, rollouts = task
+    random.seed(deal_seed(seed ^ 0x5EED, start))
+    rng = random.Random(deal_seed(seed ^ 0x1B5, start))
+    policy = make_agent(spec, deal_seed(seed ^ 0xA, start))
+    total = squares = seat0 = seat1 = 0.0
+    for i in range(start, start + count):
+        u = [0.0, 0.0]
+        for seat in (0, 1):
+            state = GameState(seed=deal_seed(seed, i))
+            while not state.is_terminal():
+                if state.current_player == seat:
+                    action = _lbr_action(state, policy, rng, max_actions, rollouts)
+                else:
+                    action = policy.get_action_codes([state])[0]
+                state.apply_action_inplace(action)
+            u[seat] = score(state)[seat]
+        pair = (u[0] + u[1]) / 2
+        total += pair
+        squares += pair * pair
+        seat0 += u[0]
+        seat1 += u[1]
+    return count, total, squares, seat0, seat1
+
+def local_best_response(spec: str, deals: int, seed: int = 0, workers: Optional[int] = None,
+                        max_actions: int = DEFAULT_LBR_ACTIONS, rollouts: int = DEFAULT_LBR_ROLLOUTS,
+                        chunk: int = 8) -> EvalResult:
+    """Выигрыш LBR против стратегии spec за раздачу — оценка эксплуатируемости снизу."""
+    start = time.perf_counter()
+    tasks = [(spec, seed, s, n, max_actions, rollouts) for s, n in _chunks(deals, chunk)]
+    parts = _run_chunks(_lbr_chunk, tasks, workers or os.cpu_count() or 1)
+    return _result(parts, time.perf_counter() - start)
+
+def format_result(name: str, r: EvalResult) -> str:
+    return (f"{name}: {r.mean:+.3f} ± {Z_95 * r.stderr:.3f} очков/раздачу (95% CI [{r.ci_low:+.3f}, {r.ci_high:+.3f}]), "
+            f"места {r.seat_means[0]:+.3f}/{r.seat_means[1]:+.3f}, {r.deals} раздач, {r.deals_per_sec:,.0f} раздач/с")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Оценка стратегии MCCFR: матчи против базовых агентов и LBR")
+    parser.add_argument('strategy', help="файл стратегии (strategy_io или pickle)")
+    parser.add_argument('--opponent', action='append', default=None,
+                        help="random, heuristic или файл стратегии; можно несколько (по умолчанию random и heuristic)")
+    parser.add_argument('--deals', type=int, default=100000)
+    parser.add_argument('--lbr-deals', type=int, default=0, help="раздач для оценки LBR (0 — не считать)")
+    parser.add_argument('--lbr-actions', type=int, default=DEFAULT_LBR_ACTIONS)
+    parser.add_argument('--lbr-rollouts', type=int, default=DEFAULT_LBR_ROLLOUTS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="записать результаты в JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for opponent in args.opponent or list(AGENT_KINDS):
+        r = head_to_head(args.strategy, opponent, args.deals, args.seed, args.workers)
+        results[f"vs {opponent}"] = r
+        print(format_result(f"против {opponent}", r))
+    if args.lbr_deals:
+        r = local_best_response(args.strategy, args.lbr_deals, args.seed, args.workers,
+                                args.lbr_actions, args.lbr_rollouts)
+        results['lbr'] = r
+        print(format_result("LBR (эксплуатируемость ≥)", r))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({name: dict(asdict(r), deals_per_sec=r.deals_per_sec) for name, r in results.items()}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
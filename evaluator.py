@@ -1,10 +1,11 @@
-# mccfr_engine/evaluator.py (v2 - исправлена ошибка с itertools.accumulate)
+# mccfr_engine/evaluator.py (v4 - роялти ряда из того же результата оценки)
 """
 Модуль для оценки рук и подсчета очков в OFC Pineapple.
 Объединяет проверенные эвалюаторы для 3 и 5 карт и логику роялти.
 """
 import itertools
 from collections import Counter
+from functools import lru_cache
 from typing import List, Tuple, Dict, Optional
 
 from card import Card, PRIMES, INT_RANKS, INVALID_CARD, STR_RANKS
@@ -217,7 +218,10 @@ ROYALTY_TOP_TRIPS: Dict[int, int] = { RANK_2: 10, RANK_3: 11, RANK_4: 12, RANK_5
 
 def get_row_royalty(cards: List[int], row_name: str) -> int:
     if not cards: return 0
-    rank_val, hand_class_val, type_str_val = get_hand_rank(cards)
+    return _royalty(cards, row_name, *get_hand_rank(cards))
+
+def _royalty(cards, row_name: str, rank_val: int, hand_class_val: int, type_str_val: str) -> int:
+    # Роялти ряда по уже посчитанному get_hand_rank(cards)
     if rank_val == WORST_RANK: return 0
     if row_name == "top":
         if hand_class_val == 6: # Trips
@@ -236,22 +240,44 @@ def get_row_royalty(cards: List[int], row_name: str) -> int:
 FANTASY_BONUS = {RANK_QUEEN: 15, RANK_KING: 20, RANK_ACE: 25, 'trips': 30}
 SCOOP_BONUS = 3
 
+ROW_CACHE_SIZE = 1 << 16
+ROW_NAMES = ('top', 'middle', 'bottom')
+
+@lru_cache(maxsize=ROW_CACHE_SIZE)
+def _row_result(cards: Tuple[int, ...], row_name: str) -> Tuple[int, int]:
+    """
+    (ранг, роялти) ряда; cards — отсортированный кортеж, чтобы порядок карт не влиял на ключ кеша.
+    Ряд оценивается один раз: роялти выводится из того же результата get_hand_rank.
+    """
+    result = get_hand_rank(list(cards))
+    return result[0], _royalty(cards, row_name, *result)
+
+def _board_results(board) -> Tuple[List[Tuple[int, int]], bool]:
+    # Один проход по доске: результаты трёх рядов и фол (только для полной доски)
+    results, complete = [], True
+    for row, size in zip(ROW_NAMES, (3, 5, 5)):
+        cards = board.get_row_cards(row)
+        complete = complete and len(cards) == size
+        results.append(_row_result(tuple(sorted(cards)), row))
+    foul = complete and (results[0][0] < results[1][0] or results[1][0] < results[2][0])
+    return results, foul
+
 def calculate_payoffs(board_p1, board_p2) -> Tuple[float, float]:
-    p1_foul = board_p1.is_foul()
-    p2_foul = board_p2.is_foul()
+    """Каждый из шести рядов оценивается один раз; фол, линии, скуп и роялти — из этих результатов."""
+    rows_p1, p1_foul = _board_results(board_p1)
+    rows_p2, p2_foul = _board_results(board_p2)
+    royalty_p1 = sum(royalty for _, royalty in rows_p1)
+    royalty_p2 = sum(royalty for _, royalty in rows_p2)
     if p1_foul and p2_foul: return 0.0, 0.0
-    if p1_foul: return -float(SCOOP_BONUS + (get_row_royalty(board_p2.get_row_cards('top'), 'top') + get_row_royalty(board_p2.get_row_cards('middle'), 'middle') + get_row_royalty(board_p2.get_row_cards('bottom'), 'bottom'))), float(SCOOP_BONUS + (get_row_royalty(board_p2.get_row_cards('top'), 'top') + get_row_royalty(board_p2.get_row_cards('middle'), 'middle') + get_row_royalty(board_p2.get_row_cards('bottom'), 'bottom')))
-    if p2_foul: return float(SCOOP_BONUS + (get_row_royalty(board_p1.get_row_cards('top'), 'top') + get_row_royalty(board_p1.get_row_cards('middle'), 'middle') + get_row_royalty(board_p1.get_row_cards('bottom'), 'bottom'))), -float(SCOOP_BONUS + (get_row_royalty(board_p1.get_row_cards('top'), 'top') + get_row_royalty(board_p1.get_row_cards('middle'), 'middle') + get_row_royalty(board_p1.get_row_cards('bottom'), 'bottom')))
+    if p1_foul: return -float(SCOOP_BONUS + royalty_p2), float(SCOOP_BONUS + royalty_p2)
+    if p2_foul: return float(SCOOP_BONUS + royalty_p1), -float(SCOOP_BONUS + royalty_p1)
 
     line_score_p1 = 0
-    for row in ['top', 'middle', 'bottom']:
-        p1_rank, _, _ = get_hand_rank(board_p1.get_row_cards(row))
-        p2_rank, _, _ = get_hand_rank(board_p2.get_row_cards(row))
+    for (p1_rank, _), (p2_rank, _) in zip(rows_p1, rows_p2):
         if p1_rank < p2_rank: line_score_p1 += 1
         elif p1_rank > p2_rank: line_score_p1 -= 1
-    
+
     if abs(line_score_p1) == 3: line_score_p1 += SCOOP_BONUS if line_score_p1 > 0 else -SCOOP_BONUS
 
-    royalty_p1 = board_p1.get_total_royalty(); royalty_p2 = board_p2.get_total_royalty()
     total_score_p1 = line_score_p1 + (royalty_p1 - royalty_p2)
     return float(total_score_p1), float(-total_score_p1)
@@ -0,0 +1,21 @@
+# mccfr_engine/hand_eval.pxd (v2 - LRU-кеш результатов рядов)
+from libc.stdint cimport int32_t, uint64_t
+
+cdef enum:
+    ROW_TOP = 0
+    ROW_MIDDLE = 1
+    ROW_BOTTOM = 2
+    WORST_RANK = 7463    # = evaluator.WORST_RANK
+    WORST_CLASS = 9
+
+# Результат оценки ряда: ранг (меньше — сильнее), класс руки (1-9) и роялти ряда
+ctypedef struct HandResult:
+    int32_t rank
+    int32_t hand_class
+    int32_t royalty
+
+cdef int32_t evaluate5(const int32_t* cards) noexcept nogil
+cdef int32_t evaluate3(const int32_t* cards) noexcept nogil
+cdef HandResult evaluate_row(const int32_t* cards, int n, int row) noexcept nogil
+# То же через общий LRU-кеш результатов рядов; mask — биты индексов карт ряда (rank * 4 + suit_idx)
+cdef HandResult cached_row(const int32_t* cards, int n, int row, uint64_t mask) noexcept nogil
@@ -0,0 +1,241 @@
+# mccfr_engine/hand_eval.pyx (v2 - LRU-кеш результатов рядов)
+"""
+Нативный эвалюатор рук OFC: ранг, класс и роялти ряда за один вызов.
+
+Таблицы строятся один раз при импорте из эталонных таблиц evaluator.py, поэтому
+результаты совпадают с evaluator.get_hand_rank / get_row_royalty один в один:
+- флеши и руки из 5 разных рангов — плоские массивы по 13-битной маске рангов;
+- руки с парами — отсортированный массив произведений простых + бинарный поиск;
+- 3 карты — плоский массив по (r0, r1, r2), r0 >= r1 >= r2.
+
+cached_row добавляет ограниченный кеш результатов рядов, общий для всех обходов в
+процессе: 2-way set-associative с LRU внутри набора, ключ — маска карт ряда + ряд.
+"""
+import numpy as np
+cimport numpy as np
+from libc.stdint cimport int32_t, uint32_t, uint16_t, uint8_t, uint64_t
+from libc.stdlib cimport calloc, free
+
+import evaluator as _ref
+
+np.import_array()
+
+ROW_CODES = {'top': ROW_TOP, 'middle': ROW_MIDDLE, 'bottom': ROW_BOTTOM}
+
+cdef enum:
+    RANK_MASKS = 1 << 13
+    NUM_PAIRED = 4888    # каре + фулл-хаус + сет + две пары + пара
+    NUM_RANK3 = 13 * 13 * 13
+
+cdef uint16_t FLUSH_RANK[RANK_MASKS]
+cdef uint16_t UNIQUE5_RANK[RANK_MASKS]
+cdef uint32_t PAIRED_PRODUCT[NUM_PAIRED]
+cdef uint16_t PAIRED_RANK[NUM_PAIRED]
+cdef uint16_t RANK3[NUM_RANK3]
+cdef uint8_t CLASS3[NUM_RANK3]
+cdef uint8_t TOP_ROYALTY3[NUM_RANK3]
+cdef int32_t CLASS_LIMIT5[WORST_CLASS + 1]       # верхняя граница ранга класса 1..9
+cdef uint8_t ROYALTY5[ROW_BOTTOM + 1][WORST_CLASS + 1]
+
+cdef void _build_tables() except *:
+    cdef int mask, i, k
+    table = _ref.evaluator_5card_instance.table
+    for mask in range(RANK_MASKS):
+        FLUSH_RANK[mask] = UNIQUE5_RANK[mask] = WORST_RANK
+        if bin(mask).count('1') == 5:
+            product = table._prime_product_from_rankbits(mask)
+            FLUSH_RANK[mask] = table.flush_lookup.get(product, WORST_RANK)
+            UNIQUE5_RANK[mask] = table.unsuited_lookup.get(product, WORST_RANK)
+
+    unique_products = {table._prime_product_from_rankbits(m) for m in range(RANK_MASKS) if bin(m).count('1') == 5}
+    paired = sorted((p, r) for p, r in table.unsuited_lookup.items() if p not in unique_products)
+    if len(paired) != NUM_PAIRED:
+        raise RuntimeError(f"Unexpected paired-hand count: {len(paired)}")
+    for i, (product, rank) in enumerate(paired):
+        PAIRED_PRODUCT[i] = product
+        PAIRED_RANK[i] = rank
+
+    for i in range(NUM_RANK3):
+        RANK3[i] = WORST_RANK
+        CLASS3[i] = WORST_CLASS
+        TOP_ROYALTY3[i] = 0
+    for ranks, (rank, type_str, _) in _ref.three_card_lookup.items():
+        i = ranks[0] * 169 + ranks[1] * 13 + ranks[2]
+        RANK3[i] = rank
+        CLASS3[i] = _ref.HAND_TYPE_TO_CLASS_3CARD.get(type_str, WORST_CLASS)
+        paired_rank = max(set(ranks), key=ranks.count)
+        if CLASS3[i] == 6:
+            TOP_ROYALTY3[i] = _ref.ROYALTY_TOP_TRIPS.get(paired_rank, 0)
+        elif CLASS3[i] == 8:
+            TOP_ROYALTY3[i] = _ref.ROYALTY_TOP_PAIRS.get(paired_rank, 0)
+
+    limits = [0, table.MAX_STRAIGHT_FLUSH, table.MAX_FOUR_OF_A_KIND, table.MAX_FULL_HOUSE, table.MAX_FLUSH,
+              table.MAX_STRAIGHT, table.MAX_THREE_OF_A_KIND, table.MAX_TWO_PAIR, table.MAX_PAIR, table.MAX_HIGH_CARD]
+    for k in range(WORST_CLASS + 1):
+        CLASS_LIMIT5[k] = limits[k]
+        name = table.RANK_CLASS_TO_STRING.get(k, "Unknown")
+        ROYALTY5[ROW_TOP][k] = 0
+        ROYALTY5[ROW_MIDDLE][k] = _ref.ROYALTY_MIDDLE_POINTS.get(name, 0)
+        ROYALTY5[ROW_BOTTOM][k] = _ref.ROYALTY_BOTTOM_POINTS.get(name, 0)
+
+_build_tables()
+
+# --- C API ---
+cdef inline int _rank(int32_t c) noexcept nogil:
+    return (c >> 8) & 0xF
+
+cdef int32_t evaluate5(const int32_t* c) noexcept nogil:
+    cdef uint32_t mask = ((c[0] | c[1] | c[2] | c[3] | c[4]) >> 16) & 0x1FFF
+    cdef uint32_t product
+    cdef int lo, hi, mid
+    if c[0] & c[1] & c[2] & c[3] & c[4] & 0xF000:
+        return FLUSH_RANK[mask]
+    if UNIQUE5_RANK[mask] != WORST_RANK:
+        return UNIQUE5_RANK[mask]
+    product = <uint32_t>(c[0] & 0x3F) * (c[1] & 0x3F) * (c[2] & 0x3F) * (c[3] & 0x3F) * (c[4] & 0x3F)
+    lo = 0
+    hi = NUM_PAIRED - 1
+    while lo <= hi:
+        mid = (lo + hi) >> 1
+        if PAIRED_PRODUCT[mid] < product:
+            lo = mid + 1
+        elif PAIRED_PRODUCT[mid] > product:
+            hi = mid - 1
+        else:
+            return PAIRED_RANK[mid]
+    return WORST_RANK
+
+cdef inline int _index3(const int32_t* c) noexcept nogil:
+    cdef int a = _rank(c[0]), b = _rank(c[1]), d = _rank(c[2]), t
+    if a < b: t = a; a = b; b = t
+    if b < d: t = b; b = d; d = t
+    if a < b: t = a; a = b; b = t
+    return a * 169 + b * 13 + d
+
+cdef int32_t evaluate3(const int32_t* c) noexcept nogil:
+    return RANK3[_index3(c)]
+
+cdef inline int32_t _class5(int32_t rank) noexcept nogil:
+    cdef int k
+    if not (0 < rank < WORST_RANK):
+        return WORST_CLASS
+    for k in range(1, WORST_CLASS):
+        if rank <= CLASS_LIMIT5[k]:
+            return k
+    return WORST_CLASS
+
+cdef HandResult evaluate_row(const int32_t* cards, int n, int row) noexcept nogil:
+    """Как get_hand_rank + get_row_royalty: 3 или 5 карт, иначе (WORST_RANK, WORST_CLASS, 0)."""
+    cdef HandResult r
+    cdef int idx
+    r.rank = WORST_RANK
+    r.hand_class = WORST_CLASS
+    r.royalty = 0
+    if n == 3:
+        idx = _index3(cards)
+        r.rank = RANK3[idx]
+        r.hand_class = CLASS3[idx]
+        if row == ROW_TOP and r.rank != WORST_RANK:
+            r.royalty = TOP_ROYALTY3[idx]
+    elif n == 5:
+        r.rank = evaluate5(cards)
+        r.hand_class = _class5(r.rank)
+        if r.rank != WORST_RANK:
+            r.royalty = ROYALTY5[row][r.hand_class]
+    return r
+
+# --- Кеш результатов рядов ---
+ctypedef struct RowCacheEntry:
+    uint64_t key       # 0 — пустая запись
+    HandResult result
+
+DEFAULT_ROW_CACHE_BITS = 16
+cdef RowCacheEntry* _row_cache = NULL    # 2 записи на набор: [MRU, LRU]
+cdef int _row_cache_bits = 0
+cdef uint64_t _cache_hits = 0, _cache_misses = 0
+
+cdef HandResult cached_row(const int32_t* cards, int n, int row, uint64_t mask) noexcept nogil:
+    global _cache_hits, _cache_misses
+    if n == 0 or _row_cache == NULL:
+        return evaluate_row(cards, n, row)
+    cdef uint64_t key = mask | (<uint64_t>(row + 1) << 56)
+    cdef RowCacheEntry* ways = &_row_cache[2 * ((key * 0x9E3779B97F4A7C15ULL) >> (64 - _row_cache_bits))]
+    cdef RowCacheEntry tmp
+    if ways[0].key == key:
+        _cache_hits += 1
+        return ways[0].result
+    if ways[1].key == key:
+        _cache_hits += 1
+        tmp = ways[1]; ways[1] = ways[0]; ways[0] = tmp
+        return ways[0].result
+    _cache_misses += 1
+    ways[1] = ways[0]
+    ways[0].key = key
+    ways[0].result = evaluate_row(cards, n, row)
+    return ways[0].result
+
+def configure_row_cache(int bits=DEFAULT_ROW_CACHE_BITS):
+    """Пересоздаёт кеш рядов на 2 * 2**bits записей; bits = 0 отключает кеш."""
+    global _row_cache, _row_cache_bits, _cache_hits, _cache_misses
+    free(_row_cache)
+    _row_cache = NULL
+    _row_cache_bits = 0
+    _cache_hits = _cache_misses = 0
+    if bits <= 0:
+        return
+    if bits > 30:
+        raise ValueError("Row cache is too large")
+    _row_cache = <RowCacheEntry*>calloc(2 << bits, sizeof(RowCacheEntry))
+    if _row_cache == NULL:
+        raise MemoryError("Row cache allocation failed")
+    _row_cache_bits = bits
+
+def clear_row_cache():
+    configure_row_cache(_row_cache_bits)
+
+def row_cache_stats():
+    return {'hits': _cache_hits, 'misses': _cache_misses,
+            'capacity': (2 << _row_cache_bits) if _row_cache != NULL else 0}
+
+configure_row_cache()
+
+# --- Python API ---
+cdef int _row_code(str row) except -1:
+    code = ROW_CODES.get(row)
+    if code is None:
+        raise ValueError(f"Unknown row: {row}")
+    return code
+
+def evaluate(cards, str row='bottom'):
+    """(rank, class, royalty) для 3 или 5 карт в ряду row."""
+    cdef int32_t buf[5]
+    cdef int i, n = len(cards)
+    if n > 5:
+        n = 0
+    for i in range(n):
+        buf[i] = cards[i]
+    cdef HandResult r = evaluate_row(buf, n, _row_code(row))
+    return r.rank, r.hand_class, r.royalty
+
+def evaluate_batch(cards, str row='bottom'):
+    """
+    Векторная оценка: cards — int-массив (N, 5) или (N, 3) в формате card.py.
+    Возвращает три int32-массива длины N: ранги, классы и роялти для ряда row.
+    """
+    cdef int32_t[:, ::1] c = np.ascontiguousarray(cards, dtype=np.int32)
+    cdef Py_ssize_t n = c.shape[0], i
+    cdef int k = c.shape[1], code = _row_code(row)
+    if k != 3 and k != 5:
+        raise ValueError(f"Expected (N, 3) or (N, 5) cards, got {np.shape(cards)}")
+    ranks = np.empty(n, dtype=np.int32)
+    classes = np.empty(n, dtype=np.int32)
+    royalties = np.empty(n, dtype=np.int32)
+    cdef int32_t[::1] rv = ranks, cv = classes, yv = royalties
+    cdef HandResult r
+    with nogil:
+        for i in range(n):
+            r = evaluate_row(&c[i, 0], k, code)
+            rv[i] = r.rank
+            cv[i] = r.hand_class
+            yv[i] = r.royalty
+    return ranks, classes, royalties
@@ -0,0 +1,67 @@
+# mccfr_engine/infoset_table.pxd (v7 - переиспользование блоков, проигранных в гонке вставки)
+from libc.stdint cimport uint64_t, int64_t, uint8_t
+
+# Одна ячейка индекса открытой адресации. key == 0 — пустая ячейка,
+# meta = (offset << META_ACTION_BITS) | num_actions, meta == 0 — узел ещё инициализируется.
+ctypedef struct InfosetEntry:
+    uint64_t key
+    uint64_t meta
+
+# Счётчики таблицы. В разделяемом режиме лежат в общей памяти вместе с индексом и ареной.
+ctypedef struct TableHeader:
+    int64_t count
+    int64_t arena_used
+    int64_t rejected      # отказы get_or_insert из-за нехватки места
+
+cdef enum:
+    META_ACTION_BITS = 16
+    MAX_TABLE_ACTIONS = (1 << META_ACTION_BITS) - 1
+    HASH_TAG_NONE = 0x6E6F6E65
+    HASH_TAG_TUPLE = 0x7475706C
+    SPARE_BLOCKS = 64   # блоков арены в списке свободных процесса
+
+# Хеш ключа строится свёрткой hash_combine по элементам: кортеж даёт HASH_TAG_TUPLE ^ len,
+# затем свои элементы; None — HASH_TAG_NONE; int — своё значение. ofc_game повторяет
+# эту свёртку напрямую по C-состоянию, не строя кортеж.
+cdef inline uint64_t splitmix64(uint64_t x) noexcept nogil:
+    x += 0x9E3779B97F4A7C15ULL
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9ULL
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EBULL
+    return x ^ (x >> 31)
+
+cdef inline uint64_t hash_combine(uint64_t h, uint64_t v) noexcept nogil:
+    return splitmix64(h ^ v)
+
+cpdef uint64_t hash_infoset_key(object key) except? 0
+
+cdef class InfosetTable:
+    cdef InfosetEntry* entries
+    cdef uint8_t* dirty          # dirty[i] = 1 — узел ячейки i менялся с последнего clear_dirty()
+    cdef float* arena
+    cdef TableHeader* header
+    cdef readonly Py_ssize_t capacity
+    cdef int64_t arena_capacity
+    cdef readonly bint shared
+    cdef object _buffer
+    # Блоки арены, зарезервированные, но не опубликованные из-за проигранного CAS: свои у
+    # каждого процесса (объект копируется при fork), остаются нулевыми и идут в следующую вставку
+    cdef int64_t _spare_offset[SPARE_BLOCKS]
+    cdef int _spare_actions[SPARE_BLOCKS]
+    cdef int _spare_count
+
+    # Типизированный API для mccfr_traverse (без GIL)
+    cdef int64_t lookup(self, uint64_t key, int* num_actions) noexcept nogil
+    cdef int64_t get_or_insert(self, uint64_t key, int num_actions) noexcept nogil
+    cdef float* regret_sum(self, int64_t offset) noexcept nogil
+    cdef float* strategy_sum(self, int64_t offset, int num_actions) noexcept nogil
+    cdef void accumulate(self, float* dst, const float* values, int n) noexcept nogil
+    cdef void accumulate_floor(self, float* dst, const float* values, int n, float floor) noexcept nogil
+
+    # Внутренние методы
+    cdef Py_ssize_t _probe(self, uint64_t key) noexcept nogil
+    cdef int _grow_index(self) noexcept nogil
+    cdef int64_t _alloc_block(self, int num_actions) noexcept nogil
+    cdef void _release_block(self, int64_t offset, int num_actions) noexcept nogil
+    cdef int64_t _get_or_insert_local(self, uint64_t key, int num_actions) noexcept nogil
+    cdef int64_t _get_or_insert_shared(self, uint64_t key, int num_actions) noexcept nogil
+    cdef dict _node(self, int64_t offset, int n)
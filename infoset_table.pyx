@@ -0,0 +1,516 @@
+# mccfr_engine/infoset_table.pyx (v8 - без утечки арены при гонке вставки)
+"""
+Хранилище инфосетов для MCCFR.
+
+Ключи инфосетов хешируются в 64 бита и хранятся в индексе с открытой адресацией
+(линейное пробирование). regret_sum и strategy_sum всех узлов лежат подряд в одной
+float32 "арене": узел с n действиями занимает 2*n float начиная со своего offset
+(сначала regret_sum, затем strategy_sum). Offset стабилен при росте таблицы,
+поэтому его можно держать во время рекурсии, а указатели — нет.
+
+InfosetTable(shared=True) размещает счётчики, индекс и арену в одном анонимном
+MAP_SHARED отображении: процессы, созданные fork'ом после создания таблицы, пишут
+в одну и ту же таблицу. Разделяемая таблица не растёт (размер задаётся заранее),
+вставка идёт через CAS по ключу, а сложение float — через CAS-цикл (без блокировок).
+
+Каждая ячейка индекса имеет флаг dirty: get_or_insert помечает узел, к которому обратился
+обход. export_chunk отдаёт узлы (все или только помеченные) по диапазону ячеек — так
+checkpoint.py пишет таблицу на диск кусками, не строя её вторую копию.
+
+accumulate_floor — сложение с полом (регреты CFR+), discount — умножение регретов и
+strategy_sum всех узлов на коэффициенты Linear/Discounted CFR; discount вызывается
+между итерациями, когда обходы не идут.
+"""
+import mmap
+import numpy as np
+cimport numpy as np
+
+from libc.stdint cimport uint64_t, int64_t, uint32_t, uint8_t
+from libc.stdlib cimport calloc, realloc, free
+from libc.string cimport memset, memcpy
+
+np.import_array()
+
+cdef extern from *:
+    """
+    #include <stdint.h>
+    #include <string.h>
+    static inline int ofc_cas_u64(uint64_t* p, uint64_t expected, uint64_t desired) {
+        return __atomic_compare_exchange_n(p, &expected, desired, 0, __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE);
+    }
+    static inline uint64_t ofc_load_u64(uint64_t* p) { return __atomic_load_n(p, __ATOMIC_ACQUIRE); }
+    static inline void ofc_store_u64(uint64_t* p, uint64_t v) { __atomic_store_n(p, v, __ATOMIC_RELEASE); }
+    static inline int64_t ofc_load_i64(int64_t* p) { return __atomic_load_n(p, __ATOMIC_ACQUIRE); }
+    static inline int64_t ofc_fetch_add_i64(int64_t* p, int64_t v) { return __atomic_fetch_add(p, v, __ATOMIC_ACQ_REL); }
+    static inline void ofc_atomic_add_float(float* p, float v) {
+        uint32_t* bits = (uint32_t*)p;
+        uint32_t expected = __atomic_load_n(bits, __ATOMIC_RELAXED), desired;
+        float f;
+        do {
+            memcpy(&f, &expected, sizeof(f));
+            f += v;
+            memcpy(&desired, &f, sizeof(f));
+        } while (!__atomic_compare_exchange_n(bits, &expected, desired, 1, __ATOMIC_RELAXED, __ATOMIC_RELAXED));
+    }
+    static inline void ofc_atomic_add_float_floor(float* p, float v, float floor) {
+        uint32_t* bits = (uint32_t*)p;
+        uint32_t expected = __atomic_load_n(bits, __ATOMIC_RELAXED), desired;
+        float f;
+        do {
+            memcpy(&f, &expected, sizeof(f));
+            f += v;
+            if (f < floor) f = floor;
+            memcpy(&desired, &f, sizeof(f));
+        } while (!__atomic_compare_exchange_n(bits, &expected, desired, 1, __ATOMIC_RELAXED, __ATOMIC_RELAXED));
+    }
+    """
+    bint ofc_cas_u64(uint64_t* p, uint64_t expected, uint64_t desired) nogil
+    uint64_t ofc_load_u64(uint64_t* p) nogil
+    void ofc_store_u64(uint64_t* p, uint64_t v) nogil
+    int64_t ofc_load_i64(int64_t* p) nogil
+    int64_t ofc_fetch_add_i64(int64_t* p, int64_t v) nogil
+    void ofc_atomic_add_float(float* p, float v) nogil
+    void ofc_atomic_add_float_floor(float* p, float v, float floor) nogil
+
+DEF_INDEX_CAPACITY = 1 << 16
+DEF_ARENA_CAPACITY = 1 << 20
+cdef double MAX_LOAD_FACTOR = 0.7
+cdef Py_ssize_t HEADER_BYTES = 64   # TableHeader, выровненный на кеш-линию
+
+# --- Хеширование ключей (splitmix64 / hash_combine — в infoset_table.pxd) ---
+cdef uint64_t _hash_obj(uint64_t h, object obj) except? 0:
+    if obj is None:
+        return hash_combine(h, HASH_TAG_NONE)
+    if isinstance(obj, tuple):
+        h = hash_combine(h, HASH_TAG_TUPLE ^ <uint64_t>len(<tuple>obj))
+        for item in <tuple>obj:
+            h = _hash_obj(h, item)
+        return h
+    return hash_combine(h, <uint64_t>(<long long>obj))
+
+cpdef uint64_t hash_infoset_key(object key) except? 0:
+    """Детерминированный 64-битный хеш ключа инфосета (не зависит от PYTHONHASHSEED)."""
+    if isinstance(key, int):
+        return <uint64_t>key if key != 0 else 1
+    cdef uint64_t h = _hash_obj(0, key)
+    return h if h != 0 else 1   # 0 зарезервирован под пустую ячейку
+
+cdef inline uint64_t _pack_meta(int64_t offset, int num_actions) noexcept nogil:
+    return (<uint64_t>offset << META_ACTION_BITS) | <uint64_t>num_actions
+
+
+cdef class InfosetTable:
+    def __cinit__(self, Py_ssize_t capacity=DEF_INDEX_CAPACITY, int64_t arena_capacity=DEF_ARENA_CAPACITY,
+                  bint shared=False):
+        cdef Py_ssize_t cap = 16
+        cdef unsigned char[::1] view
+        while cap < capacity:
+            cap <<= 1
+        self.capacity = cap
+        self.arena_capacity = max(arena_capacity, 16)
+        self.shared = shared
+        self._spare_count = 0
+        if shared:
+            self._buffer = mmap.mmap(-1, HEADER_BYTES + self.capacity * (sizeof(InfosetEntry) + sizeof(uint8_t))
+                                     + self.arena_capacity * sizeof(float))
+            view = self._buffer
+            self.header = <TableHeader*>&view[0]
+            self.entries = <InfosetEntry*>(&view[0] + HEADER_BYTES)
+            self.dirty = <uint8_t*>(&view[0] + HEADER_BYTES + self.capacity * sizeof(InfosetEntry))
+            self.arena = <float*>(&view[0] + HEADER_BYTES + self.capacity * (sizeof(InfosetEntry) + sizeof(uint8_t)))
+            return
+        self.header = <TableHeader*>calloc(1, sizeof(TableHeader))
+        self.entries = <InfosetEntry*>calloc(self.capacity, sizeof(InfosetEntry))
+        self.dirty = <uint8_t*>calloc(self.capacity, sizeof(uint8_t))
+        self.arena = <float*>calloc(self.arena_capacity, sizeof(float))
+        if self.header == NULL or self.entries == NULL or self.dirty == NULL or self.arena == NULL:
+            raise MemoryError("InfosetTable allocation failed")
+
+    def __dealloc__(self):
+        if not self.shared:
+            free(self.header)
+            free(self.entries)
+            free(self.dirty)
+            free(self.arena)
+
+    # --- Внутренние методы ---
+    cdef Py_ssize_t _probe(self, uint64_t key) noexcept nogil:
+        # Индекс ячейки с ключом key либо первой пустой ячейки на пути пробирования
+        cdef Py_ssize_t mask = self.capacity - 1
+        cdef Py_ssize_t i = <Py_ssize_t>(splitmix64(key) & mask)
+        while self.entries[i].key != 0 and self.entries[i].key != key:
+            i = (i + 1) & mask
+        return i
+
+    cdef int _grow_index(self) noexcept nogil:
+        cdef InfosetEntry* old = self.entries
+        cdef uint8_t* old_dirty = self.dirty
+        cdef Py_ssize_t old_capacity = self.capacity, i, j
+        cdef InfosetEntry* fresh = <InfosetEntry*>calloc(old_capacity * 2, sizeof(InfosetEntry))
+        cdef uint8_t* fresh_dirty = <uint8_t*>calloc(old_capacity * 2, sizeof(uint8_t))
+        if fresh == NULL or fresh_dirty == NULL:
+            free(fresh)
+            free(fresh_dirty)
+            return -1
+        self.entries = fresh
+        self.dirty = fresh_dirty
+        self.capacity = old_capacity * 2
+        for i in range(old_capacity):
+            if old[i].key != 0:
+                j = self._probe(old[i].key)
+                self.entries[j] = old[i]
+                self.dirty[j] = old_dirty[i]
+        free(old)
+        free(old_dirty)
+        return 0
+
+    cdef int64_t _alloc_block(self, int num_actions) noexcept nogil:
+        cdef int64_t need = 2 * <int64_t>num_actions
+        cdef int64_t new_capacity = self.arena_capacity
+        cdef int64_t offset
+        cdef float* grown
+        cdef int j
+        if self.shared:
+            for j in range(self._spare_count):
+                if self._spare_actions[j] == num_actions:
+                    offset = self._spare_offset[j]
+                    self._spare_count -= 1
+                    self._spare_offset[j] = self._spare_offset[self._spare_count]
+                    self._spare_actions[j] = self._spare_actions[self._spare_count]
+                    return offset
+            offset = ofc_fetch_add_i64(&self.header.arena_used, need)
+            return offset if offset + need <= self.arena_capacity else -1
+        if self.header.arena_used + need > self.arena_capacity:
+            while self.header.arena_used + need > new_capacity:
+                new_capacity *= 2
+            grown = <float*>realloc(self.arena, new_capacity * sizeof(float))
+            if grown == NULL:
+                return -1
+            memset(grown + self.arena_capacity, 0, (new_capacity - self.arena_capacity) * sizeof(float))
+            self.arena = grown
+            self.arena_capacity = new_capacity
+        offset = self.header.arena_used
+        self.header.arena_used += need
+        return offset
+
+    cdef void _release_block(self, int64_t offset, int num_actions) noexcept nogil:
+        # Блок проиграл CAS и не опубликован: в арену его никто не писал, процесс отдаст его следующей вставке
+        if self._spare_count < SPARE_BLOCKS:
+            self._spare_offset[self._spare_count] = offset
+            self._spare_actions[self._spare_count] = num_actions
+            self._spare_count += 1
+
+    cdef int64_t _get_or_insert_shared(self, uint64_t key, int num_actions) noexcept nogil:
+        cdef Py_ssize_t mask = self.capacity - 1
+        cdef Py_ssize_t i = <Py_ssize_t>(splitmix64(key) & mask)
+        cdef int64_t reserved = -1, offset
+        cdef uint64_t k, meta
+        while True:
+            k = ofc_load_u64(&self.entries[i].key)
+            if k == key:
+                if reserved >= 0:
+                    # Этот ключ вставил другой процесс, пока мы резервировали блок
+                    self._release_block(reserved, num_actions)
+                    reserved = -1
+                meta = ofc_load_u64(&self.entries[i].meta)
+                while meta == 0:   # другой процесс как раз вставляет этот узел
+                    meta = ofc_load_u64(&self.entries[i].meta)
+                self.dirty[i] = 1
+                if <int>(meta & MAX_TABLE_ACTIONS) == num_actions:
+                    return <int64_t>(meta >> META_ACTION_BITS)
+                offset = self._alloc_block(num_actions)
+                if offset < 0:
+                    return -1
+                if ofc_cas_u64(&self.entries[i].meta, meta, _pack_meta(offset, num_actions)):
+                    return offset
+                self._release_block(offset, num_actions)
+                continue
+            if k == 0:
+                if reserved < 0:
+                    # Блок резервируется до захвата ключа: захваченная ячейка всегда получает meta,
+                    # а блок, проигравший ключ другому процессу, уходит в _release_block
+                    if ofc_load_i64(&self.header.count) + 1 > self.capacity * MAX_LOAD_FACTOR:
+                        return -1
+                    reserved = self._alloc_block(num_actions)
+                    if reserved < 0:
+                        return -1
+                if ofc_cas_u64(&self.entries[i].key, 0, key):
+                    self.dirty[i] = 1
+                    ofc_store_u64(&self.entries[i].meta, _pack_meta(reserved, num_actions))
+                    ofc_fetch_add_i64(&self.header.count, 1)
+                    return reserved
+                continue
+            i = (i + 1) & mask
+
+    # --- Типизированный API ---
+    cdef int64_t lookup(self, uint64_t key, int* num_actions) noexcept nogil:
+        """Offset узла в арене или -1, если ключа нет."""
+        cdef Py_ssize_t i = self._probe(key)
+        cdef uint64_t meta = ofc_load_u64(&self.entries[i].meta) if self.shared else self.entries[i].meta
+        if self.entries[i].key == 0 or meta == 0:
+            return -1
+        num_actions[0] = <int>(meta & MAX_TABLE_ACTIONS)
+        return <int64_t>(meta >> META_ACTION_BITS)
+
+    cdef int64_t get_or_insert(self, uint64_t key, int num_actions) noexcept nogil:
+        """
+        Offset узла с num_actions действиями. Новый узел (или узел, у которого изменилось
+        число действий) получает обнулённый блок в арене. Узел помечается dirty. -1, если узла нет,
+        а места под него не осталось (заполнена разделяемая таблица или не хватило памяти), — такие
+        отказы считает rejected.
+        """
+        cdef int64_t offset = -1
+        if 0 < num_actions <= MAX_TABLE_ACTIONS:
+            if self.shared:
+                offset = self._get_or_insert_shared(key, num_actions)
+            else:
+                offset = self._get_or_insert_local(key, num_actions)
+        if offset < 0:
+            if self.shared:
+                ofc_fetch_add_i64(&self.header.rejected, 1)
+            else:
+                self.header.rejected += 1
+        return offset
+
+    cdef int64_t _get_or_insert_local(self, uint64_t key, int num_actions) noexcept nogil:
+        cdef Py_ssize_t i = self._probe(key)
+        cdef int64_t offset
+        if self.entries[i].key != 0:
+            self.dirty[i] = 1
+            if <int>(self.entries[i].meta & MAX_TABLE_ACTIONS) == num_actions:
+                return <int64_t>(self.entries[i].meta >> META_ACTION_BITS)
+            # Число действий изменилось: старый блок остаётся в арене мусором
+            offset = self._alloc_block(num_actions)
+            if offset < 0:
+                return -1
+            self.entries[i].meta = _pack_meta(offset, num_actions)
+            return offset
+
+        if (self.header.count + 1) > self.capacity * MAX_LOAD_FACTOR:
+            if self._grow_index() != 0:
+                return -1
+            i = self._probe(key)
+        offset = self._alloc_block(num_actions)
+        if offset < 0:
+            return -1
+        self.entries[i].key = key
+        self.entries[i].meta = _pack_meta(offset, num_actions)
+        self.dirty[i] = 1
+        self.header.count += 1
+        return offset
+
+    cdef float* regret_sum(self, int64_t offset) noexcept nogil:
+        return self.arena + offset
+
+    cdef float* strategy_sum(self, int64_t offset, int num_actions) noexcept nogil:
+        return self.arena + offset + num_actions
+
+    cdef void accumulate(self, float* dst, const float* values, int n) noexcept nogil:
+        """dst[i] += values[i]; в разделяемом режиме — атомарно."""
+        cdef int i
+        if self.shared:
+            for i in range(n):
+                ofc_atomic_add_float(dst + i, values[i])
+        else:
+            for i in range(n):
+                dst[i] += values[i]
+
+    cdef void accumulate_floor(self, float* dst, const float* values, int n, float floor) noexcept nogil:
+        """dst[i] = max(dst[i] + values[i], floor); в разделяемом режиме — атомарно."""
+        cdef int i
+        cdef float v
+        if self.shared:
+            for i in range(n):
+                ofc_atomic_add_float_floor(dst + i, values[i], floor)
+        else:
+            for i in range(n):
+                v = dst[i] + values[i]
+                dst[i] = v if v > floor else floor
+
+    # --- Python API (dict-подобное представление только для чтения) ---
+    def __len__(self):
+        return self.header.count
+
+    def __contains__(self, key):
+        cdef int n
+        return self.lookup(hash_infoset_key(key), &n) >= 0
+
+    def __getitem__(self, key):
+        cdef int n = 0
+        cdef int64_t offset = self.lookup(hash_infoset_key(key), &n)
+        if offset < 0:
+            raise KeyError(key)
+        return self._node(offset, n)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    cdef dict _node(self, int64_t offset, int n):
+        cdef np.ndarray[np.float32_t] regrets = np.empty(n, dtype=np.float32)
+        cdef np.ndarray[np.float32_t] strategy = np.empty(n, dtype=np.float32)
+        memcpy(<void*>regrets.data, self.regret_sum(offset), n * sizeof(float))
+        memcpy(<void*>strategy.data, self.strategy_sum(offset, n), n * sizeof(float))
+        return {'regret_sum': regrets, 'strategy_sum': strategy}
+
+    def keys(self):
+        """Хешированные (uint64) ключи всех инфосетов."""
+        cdef Py_ssize_t i
+        for i in range(self.capacity):
+            if self.entries[i].meta != 0:
+                yield self.entries[i].key
+
+    def items(self):
+        cdef Py_ssize_t i
+        cdef uint64_t meta
+        for i in range(self.capacity):
+            meta = self.entries[i].meta
+            if meta != 0:
+                yield self.entries[i].key, self._node(<int64_t>(meta >> META_ACTION_BITS), <int>(meta & MAX_TABLE_ACTIONS))
+
+    def __iter__(self):
+        return self.keys()
+
+    @property
+    def nbytes(self):
+        """Выделенная память (ёмкость, а не заполненность): индекс с флагами dirty + вся арена; занятое — node_bytes."""
+        return self.capacity * (sizeof(InfosetEntry) + sizeof(uint8_t)) + self.arena_capacity * sizeof(float)
+
+    @property
+    def node_bytes(self):
+        """Память самих узлов: их ячейки индекса + заполненная часть арены, без запаса ёмкости."""
+        return (self.header.count * sizeof(InfosetEntry)
+                + min(self.header.arena_used, self.arena_capacity) * sizeof(float))
+
+    @property
+    def rejected(self):
+        """Число отказов get_or_insert: узлы, не поместившиеся в таблицу."""
+        return self.header.rejected
+
+    @property
+    def load(self):
+        """(заполненность индекса, заполненность арены) — для контроля разделяемой таблицы."""
+        return (self.header.count / <double>self.capacity,
+                min(self.header.arena_used, self.arena_capacity) / <double>self.arena_capacity)
+
+    # --- Сериализация (pickle, strategy_io) ---
+    def to_arrays(self):
+        """(keys, metas, arena): хеши ключей, упакованные meta и занятая часть арены (копии)."""
+        cdef Py_ssize_t i, k = 0
+        cdef np.ndarray[np.uint64_t] keys = np.empty(self.header.count, dtype=np.uint64)
+        cdef np.ndarray[np.uint64_t] metas = np.empty(self.header.count, dtype=np.uint64)
+        for i in range(self.capacity):
+            if self.entries[i].meta != 0:
+                keys[k] = self.entries[i].key
+                metas[k] = self.entries[i].meta
+                k += 1
+        cdef int64_t used = min(self.header.arena_used, self.arena_capacity)
+        arena = np.empty(used, dtype=np.float32)
+        if used:
+            memcpy(<void*>(<np.ndarray>arena).data, self.arena, used * sizeof(float))
+        return keys[:k], metas[:k], arena
+
+    def __reduce__(self):
+        return (_rebuild_table, self.to_arrays())
+
+    # --- Чекпоинты ---
+    def export_chunk(self, Py_ssize_t start, Py_ssize_t stop, bint dirty_only=False):
+        """
+        Узлы ячеек [start, stop): (keys uint64, counts uint32, values float32), где values —
+        regret_sum и strategy_sum узлов подряд; dirty_only — только помеченные узлы.
+        Вызывать, пока обходы не идут.
+        """
+        cdef Py_ssize_t i, k = 0, stop_ = min(stop, self.capacity), start_ = max(start, 0)
+        cdef int64_t total = 0, pos = 0, offset
+        cdef uint64_t meta
+        cdef int n
+        for i in range(start_, stop_):
+            if self.entries[i].meta != 0 and (self.dirty[i] or not dirty_only):
+                k += 1
+                total += 2 * <int64_t>(self.entries[i].meta & MAX_TABLE_ACTIONS)
+        cdef np.ndarray[np.uint64_t] keys = np.empty(k, dtype=np.uint64)
+        cdef np.ndarray[np.uint32_t] counts = np.empty(k, dtype=np.uint32)
+        cdef np.ndarray[np.float32_t] values = np.empty(total, dtype=np.float32)
+        k = 0
+        for i in range(start_, stop_):
+            meta = self.entries[i].meta
+            if meta != 0 and (self.dirty[i] or not dirty_only):
+                n = <int>(meta & MAX_TABLE_ACTIONS)
+                offset = <int64_t>(meta >> META_ACTION_BITS)
+                keys[k] = self.entries[i].key
+                counts[k] = n
+                memcpy(<float*>values.data + pos, self.arena + offset, 2 * n * sizeof(float))
+                pos += 2 * n
+                k += 1
+        return keys, counts, values
+
+    def load_records(self, np.ndarray[np.uint64_t, mode='c'] keys, np.ndarray[np.uint32_t, mode='c'] counts,
+                     np.ndarray[np.float32_t, mode='c'] values):
+        """Записывает узлы в формате export_chunk (существующие перезаписываются); пометки не ставит."""
+        cdef Py_ssize_t i, j
+        cdef int64_t pos = 0, offset
+        cdef int n
+        if values.shape[0] != 2 * counts.astype(np.int64).sum():
+            raise ValueError("Values do not match action counts")
+        for i in range(keys.shape[0]):
+            n = counts[i]
+            offset = self.get_or_insert(keys[i], n)
+            if offset < 0:
+                raise MemoryError("InfosetTable is full")
+            memcpy(self.arena + offset, <float*>values.data + pos, 2 * n * sizeof(float))
+            pos += 2 * n
+            j = self._probe(keys[i])
+            self.dirty[j] = 0
+
+    def discount(self, double regret_pos, double regret_neg, double strategy):
+        """
+        Умножает положительные регреты на regret_pos, отрицательные — на regret_neg,
+        strategy_sum — на strategy. Вызывать, пока обходы не идут. Флаги dirty не меняются:
+        инкрементальный чекпоинт хранит сами коэффициенты и применяет их к узлам старых файлов.
+        """
+        cdef Py_ssize_t i
+        cdef int64_t offset
+        cdef uint64_t meta
+        cdef int n, j
+        cdef float* block
+        with nogil:
+            for i in range(self.capacity):
+                meta = self.entries[i].meta
+                if meta == 0:
+                    continue
+                offset = <int64_t>(meta >> META_ACTION_BITS)
+                n = <int>(meta & MAX_TABLE_ACTIONS)
+                block = self.arena + offset
+                for j in range(n):
+                    block[j] *= <float>(regret_pos if block[j] > 0 else regret_neg)
+                for j in range(n, 2 * n):
+                    block[j] *= <float>strategy
+
+    def clear_dirty(self):
+        memset(self.dirty, 0, self.capacity * sizeof(uint8_t))
+
+    @property
+    def dirty_count(self):
+        cdef Py_ssize_t i, n = 0
+        for i in range(self.capacity):
+            if self.dirty[i] and self.entries[i].meta != 0:
+                n += 1
+        return n
+
+
+def _rebuild_table(np.ndarray[np.uint64_t] keys, np.ndarray[np.uint64_t] metas, np.ndarray arena):
+    cdef Py_ssize_t n = keys.shape[0], i, j
+    cdef InfosetTable table = InfosetTable(capacity=max(16, <Py_ssize_t>(n / MAX_LOAD_FACTOR) + 1),
+                                           arena_capacity=max(16, arena.shape[0]))
+    cdef np.ndarray[np.float32_t] data = np.ascontiguousarray(arena, dtype=np.float32)
+    if data.shape[0]:
+        memcpy(table.arena, <void*>data.data, data.shape[0] * sizeof(float))
+    table.header.arena_used = data.shape[0]
+    for i in range(n):
+        j = table._probe(keys[i])
+        table.entries[j].key = keys[i]
+        table.entries[j].meta = metas[i]
+    table.header.count = n
+    return table
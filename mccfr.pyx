@@ -1,59 +1,499 @@
-# mccfr_engine/mccfr.pyx (v11)
+# mccfr_engine/mccfr.pyx (v19 - apply_discount возвращает коэффициенты шага)
+"""
+Обходы дерева для MCCFR.
+
+mccfr_traverse              — полный (full-width) обход: все действия обоих игроков, регреты и
+                              средняя стратегия взвешиваются вероятностями достижения.
+external_sampling_traverse  — перебираются действия traverser'а, действия оппонента сэмплируются.
+outcome_sampling_traverse   — сэмплируется одна траектория, регреты взвешиваются по важности.
+run_iterations              — драйвер итераций с чередованием traverser'а.
+
+Шанс (раздача колоды) сэмплируется один раз в корне: GameState тасует колоду при создании.
+Обходы работают с копией CGameState через state_apply/state_undo: во внутренних узлах
+нет выделений памяти, действия и стратегии лежат в массивах на стеке.
+
+Правило обновления задаёт configure_updates: vanilla, cfr+ (регреты не опускаются ниже 0),
+linear и dcfr (Linear/Discounted CFR). Веса итераций Linear/DCFR и линейное усреднение
+CFR+ применяются периодическим дисконтированием всей таблицы (apply_discount), которое
+вызывает драйвер обучения между итерациями, — так float32-суммы не растут с номером итерации.
+Отсечение по регретам (pruning) в external sampling не обходит действия traverser'а с
+нулевой вероятностью и регретом ниже порога; каждая revisit_interval-я итерация идёт без
+отсечения, чтобы такие действия могли вернуться.
+
+Разделяемая таблица не растёт: когда она заполнена, новые узлы не вставляются (их считает
+InfosetTable.rejected) и проходятся с равномерной стратегией без обновлений, а узлы, уже
+лежащие в таблице, продолжают обучаться.
+
+Счётчики посещённых узлов и терминалов ведутся всегда (node_counts). Сборка с
+OFC_INSTRUMENT=1 (см. setup.py) дополнительно считает узлы по улицам, время подсчёта
+терминалов, генерации действий и построения ключей (instrument_stats) и вызывает
+set_node_hook-callback каждые N узлов. В обычной сборке эти ветки — `if 0` и
+вырезаются компилятором C.
+"""
 import numpy as np
 cimport numpy as np
+from libc.stdint cimport int64_t, uint64_t
+from libc.string cimport memset
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
 
-from ofc_game cimport GameState
+from ofc_game cimport (GameState, CGameState, CAction, CUndo, NUM_PLAYERS, MAX_STATE_ACTIONS, LAST_STREET,
+                       state_is_terminal, state_legal_actions, state_apply, state_undo,
+                       state_infoset_hash, state_payoffs)
+from infoset_table cimport InfosetTable
 
-cpdef mccfr_traverse(GameState state, dict strategy_profile):
-    if state.is_terminal():
-        return state.get_payoffs()
+cdef extern from *:
+    """
+    #ifndef OFC_INSTRUMENT
+    #define OFC_INSTRUMENT 0
+    #endif
+    """
+    bint OFC_INSTRUMENT
 
-    infoset_key = state.get_infoset_key()
-    current_player = state.current_player
-    legal_actions = state.get_legal_actions()
-    num_actions = len(legal_actions)
+SAMPLING_MODES = ('full', 'external', 'outcome')
+OS_EXPLORATION = 0.6   # доля равномерного исследования в outcome sampling
+UPDATE_RULES = ('vanilla', 'cfr+', 'linear', 'dcfr')
+DCFR_ALPHA, DCFR_BETA, DCFR_GAMMA = 1.5, 0.0, 2.0
+DEFAULT_PRUNE_THRESHOLD = -300.0   # регрет в очках, ниже которого действие отсекается
+DEFAULT_REVISIT_INTERVAL = 20      # каждая N-я итерация — без отсечения
+INSTRUMENTED = bool(OFC_INSTRUMENT)
+TIMERS = ('evaluation', 'actions', 'keys')
 
-    if num_actions == 0:
-        next_state = state.apply_action(None)
-        return mccfr_traverse(next_state, strategy_profile)
-
-    if infoset_key not in strategy_profile:
-        strategy_profile[infoset_key] = {
-            'regret_sum': np.zeros(num_actions, dtype=np.float32),
-            'strategy_sum': np.zeros(num_actions, dtype=np.float32),
-        }
-    
-    node = strategy_profile[infoset_key]
-    
-    if node['regret_sum'].shape[0] != num_actions:
-        node['regret_sum'] = np.zeros(num_actions, dtype=np.float32)
-        node['strategy_sum'] = np.zeros(num_actions, dtype=np.float32)
-
-    cdef np.ndarray[np.float32_t] regrets = node['regret_sum']
-    cdef np.ndarray[np.float32_t] strategy
-    
-    positive_regrets = np.maximum(regrets, 0)
-    regret_sum_total = np.sum(positive_regrets)
-    
-    if regret_sum_total > 0:
-        strategy = positive_regrets / regret_sum_total
+# --- Счётчики и инструментирование ---
+cdef enum:
+    TIMER_EVALUATION = 0
+    TIMER_ACTIONS = 1
+    TIMER_KEYS = 2
+    NUM_TIMERS = 3
+    NUM_STREET_SLOTS = LAST_STREET + 2   # улицы 1..LAST_STREET и слот для терминалов за последней улицей
+
+cdef uint64_t _nodes = 0
+cdef uint64_t _terminals = 0
+cdef uint64_t _street_nodes[NUM_STREET_SLOTS]
+cdef uint64_t _timer_ns[NUM_TIMERS]
+cdef object _node_hook = None
+cdef uint64_t _hook_every = 0
+cdef uint64_t _hook_countdown = 0
+
+cdef inline uint64_t _now_ns() noexcept nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return <uint64_t>ts.tv_sec * 1000000000ULL + <uint64_t>ts.tv_nsec
+
+cpdef tuple node_counts():
+    """(посещённые узлы, подсчитанные терминалы) с последнего reset_counters()."""
+    return _nodes, _terminals
+
+cpdef dict instrument_stats():
+    """Узлы по улицам и время по фазам (секунды); в обычной сборке — только общие счётчики."""
+    stats = {'instrumented': INSTRUMENTED, 'nodes': _nodes, 'terminals': _terminals}
+    if OFC_INSTRUMENT:
+        stats['nodes_by_street'] = {street: _street_nodes[street] for street in range(1, NUM_STREET_SLOTS)}
+        stats['seconds'] = {name: _timer_ns[i] * 1e-9 for i, name in enumerate(TIMERS)}
+    return stats
+
+cpdef void reset_counters():
+    global _nodes, _terminals, _hook_countdown
+    _nodes = _terminals = 0
+    memset(_street_nodes, 0, sizeof(_street_nodes))
+    memset(_timer_ns, 0, sizeof(_timer_ns))
+    _hook_countdown = _hook_every
+
+def set_node_hook(callback, uint64_t every=100000):
+    """
+    callback(instrument_stats()) каждые every узлов; None отключает. Работает только
+    в сборке с OFC_INSTRUMENT=1, исключение из callback прерывает обход.
+    """
+    global _node_hook, _hook_every, _hook_countdown
+    if callback is not None and not OFC_INSTRUMENT:
+        raise RuntimeError("Node hooks require a build with OFC_INSTRUMENT=1")
+    _node_hook = callback
+    _hook_every = every if callback is not None else 0
+    _hook_countdown = _hook_every
+
+cdef int _visit(const CGameState* s) except -1:
+    # Вход в узел обхода
+    global _nodes, _hook_countdown
+    _nodes += 1
+    if OFC_INSTRUMENT:
+        _street_nodes[s.street if s.street <= LAST_STREET else NUM_STREET_SLOTS - 1] += 1
+        if _hook_every:
+            _hook_countdown -= 1
+            if _hook_countdown == 0:
+                _hook_countdown = _hook_every
+                _node_hook(instrument_stats())
+    return 0
+
+cdef inline void _payoffs(const CGameState* s, double* out) noexcept nogil:
+    global _terminals
+    cdef uint64_t t0 = 0
+    _terminals += 1
+    if OFC_INSTRUMENT:
+        t0 = _now_ns()
+    state_payoffs(s, out)
+    if OFC_INSTRUMENT:
+        _timer_ns[TIMER_EVALUATION] += _now_ns() - t0
+
+cdef inline int _legal_actions(const CGameState* s, CAction* out) noexcept nogil:
+    cdef uint64_t t0 = 0
+    cdef int n
+    if OFC_INSTRUMENT:
+        t0 = _now_ns()
+    n = state_legal_actions(s, out)
+    if OFC_INSTRUMENT:
+        _timer_ns[TIMER_ACTIONS] += _now_ns() - t0
+    return n
+
+cdef inline uint64_t _infoset_hash(const CGameState* s) noexcept nogil:
+    cdef uint64_t t0 = 0, h
+    if OFC_INSTRUMENT:
+        t0 = _now_ns()
+    h = state_infoset_hash(s)
+    if OFC_INSTRUMENT:
+        _timer_ns[TIMER_KEYS] += _now_ns() - t0
+    return h
+
+# --- ГСЧ сэмплирования (xorshift64*) ---
+cdef uint64_t _rng_state = 0x853C49E6748FEA9BULL
+
+cpdef void seed_sampler(uint64_t seed):
+    global _rng_state
+    _rng_state = seed if seed != 0 else 0x853C49E6748FEA9BULL
+
+cpdef uint64_t get_sampler_state():
+    return _rng_state
+
+cpdef void set_sampler_state(uint64_t state):
+    seed_sampler(state)
+
+cdef inline double _rand_unit() noexcept nogil:
+    global _rng_state
+    _rng_state ^= _rng_state >> 12
+    _rng_state ^= _rng_state << 25
+    _rng_state ^= _rng_state >> 27
+    return ((_rng_state * 0x2545F4914F6CDD1DULL) >> 11) * (1.0 / 9007199254740992.0)
+
+cdef int _sample(const float* probs, int n) noexcept nogil:
+    cdef double r = _rand_unit(), acc = 0.0
+    cdef int i
+    for i in range(n - 1):
+        acc += probs[i]
+        if r < acc:
+            return i
+    return n - 1
+
+# --- Правила обновления ---
+cdef str _rule = 'vanilla'
+cdef bint _floor_regrets = False
+cdef double _alpha = DCFR_ALPHA, _beta = DCFR_BETA, _gamma = DCFR_GAMMA
+cdef bint _pruning = False
+cdef float _prune_threshold = DEFAULT_PRUNE_THRESHOLD
+cdef int _prune_after = 0
+cdef int _revisit_interval = DEFAULT_REVISIT_INTERVAL
+
+def configure_updates(str rule='vanilla', double alpha=DCFR_ALPHA, double beta=DCFR_BETA, double gamma=DCFR_GAMMA,
+                      bint pruning=False, double prune_threshold=DEFAULT_PRUNE_THRESHOLD, int prune_after=0,
+                      int revisit_interval=DEFAULT_REVISIT_INTERVAL):
+    """
+    Правило обновления для обходов текущего процесса (воркеры наследуют его через fork).
+    alpha/beta/gamma — параметры dcfr; отсечение включается с итерации prune_after.
+    """
+    global _rule, _floor_regrets, _alpha, _beta, _gamma, _pruning, _prune_threshold, _prune_after, _revisit_interval
+    if rule not in UPDATE_RULES:
+        raise ValueError(f"Unknown update rule: {rule}")
+    if revisit_interval < 1:
+        raise ValueError("revisit_interval must be >= 1")
+    _rule = rule
+    _floor_regrets = rule == 'cfr+'
+    _alpha, _beta, _gamma = alpha, beta, gamma
+    _pruning = pruning
+    _prune_threshold = <float>prune_threshold
+    _prune_after = prune_after
+    _revisit_interval = revisit_interval
+
+def update_config():
+    """Текущие параметры configure_updates (для сохранения в чекпоинт)."""
+    return {'rule': _rule, 'alpha': _alpha, 'beta': _beta, 'gamma': _gamma, 'pruning': bool(_pruning),
+            'prune_threshold': float(_prune_threshold), 'prune_after': _prune_after,
+            'revisit_interval': _revisit_interval}
+
+cpdef tuple discount_factors(int64_t step):
+    """
+    Коэффициенты (положительные регреты, отрицательные регреты, strategy_sum) для шага
+    дисконтирования step >= 1; None, если правило не дисконтирует.
+    """
+    if _rule == 'vanilla' or step < 1:
+        return None
+    cdef double t = <double>step
+    if _rule == 'cfr+':
+        return 1.0, 1.0, t / (t + 1.0)
+    if _rule == 'linear':
+        return t / (t + 1.0), t / (t + 1.0), t / (t + 1.0)
+    return t ** _alpha / (t ** _alpha + 1.0), t ** _beta / (t ** _beta + 1.0), (t / (t + 1.0)) ** _gamma
+
+cpdef tuple apply_discount(InfosetTable table, int64_t step):
+    """
+    Дисконтирует таблицу для шага step; вызывать, пока обходы не идут. Возвращает применённые
+    коэффициенты (для манифеста чекпоинта) или None, если правило не дисконтирует.
+    """
+    factors = discount_factors(step)
+    if factors is not None:
+        table.discount(*factors)
+    return factors
+
+cdef inline void _add_regrets(InfosetTable table, int64_t offset, const float* delta, int n) noexcept nogil:
+    if _floor_regrets:
+        table.accumulate_floor(table.regret_sum(offset), delta, n, 0.0)
+    else:
+        table.accumulate(table.regret_sum(offset), delta, n)
+
+cdef inline bint _prune_iteration(int t) noexcept nogil:
+    return _pruning and t >= _prune_after and t % _revisit_interval != 0
+
+# --- Общие помощники ---
+cdef void regret_matching(const float* regrets, float* strategy, int n) noexcept nogil:
+    cdef int i
+    cdef double total = 0.0
+    for i in range(n):
+        if regrets[i] > 0:
+            total += regrets[i]
+    if total > 0:
+        for i in range(n):
+            strategy[i] = <float>(regrets[i] / total) if regrets[i] > 0 else 0.0
+    else:
+        for i in range(n):
+            strategy[i] = 1.0 / n
+
+cdef int64_t _current_strategy(InfosetTable table, const CGameState* s, int num_actions, float* strategy) noexcept nogil:
+    # Offset узла s в table; в strategy записывается текущая стратегия regret matching.
+    # Узел, не поместившийся в заполненную таблицу (-1), играет равномерно — как новый узел
+    # с нулевыми регретами, — а его обновления пропускаются: обучение известных узлов идёт дальше
+    cdef int64_t offset = table.get_or_insert(_infoset_hash(s), num_actions)
+    cdef int i
+    if offset >= 0:
+        regret_matching(table.regret_sum(offset), strategy, num_actions)
     else:
-        strategy = np.ones(num_actions, dtype=np.float32) / num_actions
+        for i in range(num_actions):
+            strategy[i] = 1.0 / num_actions
+    return offset
+
+# --- Полный обход ---
+cdef int _full(CGameState* s, InfosetTable table, const double* reach, double* out) except -1:
+    # out[p] — ожидаемый выигрыш игрока p в узле s; reach[p] — вероятность достижения s по стратегии p
+    cdef CUndo undo
+    cdef int p
+    for p in range(NUM_PLAYERS):
+        out[p] = 0.0
+    if reach[0] == 0.0 and reach[1] == 0.0:
+        # Узел недостижим ни для кого: его значения не влияют ни на одно обновление
+        return 0
+    _visit(s)
+    if state_is_terminal(s):
+        _payoffs(s, out)
+        return 0
+
+    cdef CAction actions[MAX_STATE_ACTIONS]
+    cdef int num_actions = _legal_actions(s, actions)
+    if num_actions == 0:
+        state_apply(s, NULL, &undo)
+        _full(s, table, reach, out)
+        state_undo(s, &undo)
+        return 0
+
+    cdef int current_player = s.current_player
+    cdef float strategy[MAX_STATE_ACTIONS]
+    cdef float delta[MAX_STATE_ACTIONS]
+    cdef double action_utils[MAX_STATE_ACTIONS * NUM_PLAYERS]
+    cdef double child_reach[NUM_PLAYERS]
+    cdef int64_t offset = _current_strategy(table, s, num_actions, strategy)
+    cdef double opponent_reach = reach[1 - current_player]
+    cdef int i
+
+    # Средняя стратегия взвешивается собственной вероятностью достижения игрока
+    for i in range(num_actions):
+        delta[i] = <float>(reach[current_player] * strategy[i])
+    if offset >= 0:
+        table.accumulate(table.strategy_sum(offset, num_actions), delta, num_actions)
+
+    for i in range(num_actions):
+        child_reach[0] = reach[0]
+        child_reach[1] = reach[1]
+        child_reach[current_player] *= strategy[i]
+        state_apply(s, &actions[i], &undo)
+        _full(s, table, child_reach, &action_utils[i * NUM_PLAYERS])
+        state_undo(s, &undo)
+        for p in range(NUM_PLAYERS):
+            out[p] += strategy[i] * action_utils[i * NUM_PLAYERS + p]
+
+    # Контрфактические регреты — с весом вероятности достижения оппонента;
+    # рекурсия могла увеличить арену: указатель берём заново по offset
+    for i in range(num_actions):
+        delta[i] = <float>(opponent_reach * (action_utils[i * NUM_PLAYERS + current_player] - out[current_player]))
+    if offset >= 0:
+        _add_regrets(table, offset, delta, num_actions)
+    return 0
+
+cpdef mccfr_traverse(GameState state, InfosetTable table):
+    cdef CGameState s = state.s
+    cdef double reach[NUM_PLAYERS]
+    cdef np.ndarray[np.float64_t] utils = np.zeros(NUM_PLAYERS)
+    reach[0] = reach[1] = 1.0
+    _full(&s, table, reach, <double*>utils.data)
+    return utils
 
-    node['strategy_sum'] += strategy
+# --- External sampling ---
+cdef double _external(CGameState* s, InfosetTable table, int traverser, bint prune) except? -1e300:
+    cdef CUndo undo
+    cdef double value
+    cdef double payoffs[NUM_PLAYERS]
+    _visit(s)
+    if state_is_terminal(s):
+        _payoffs(s, payoffs)
+        return payoffs[traverser]
 
-    cdef np.ndarray[np.float64_t, ndim=2] action_utils = np.zeros((num_actions, state.players))
+    cdef CAction actions[MAX_STATE_ACTIONS]
+    cdef int num_actions = _legal_actions(s, actions)
+    if num_actions == 0:
+        state_apply(s, NULL, &undo)
+        value = _external(s, table, traverser, prune)
+        state_undo(s, &undo)
+        return value
+
+    cdef float strategy[MAX_STATE_ACTIONS]
+    cdef float delta[MAX_STATE_ACTIONS]
+    cdef double action_utils[MAX_STATE_ACTIONS]
+    cdef bint explored[MAX_STATE_ACTIONS]
+    cdef int64_t offset = _current_strategy(table, s, num_actions, strategy)
+    cdef double node_util = 0.0
     cdef int i
-    for i, action in enumerate(legal_actions):
-        next_state = state.apply_action(action)
-        action_utils[i] = mccfr_traverse(next_state, strategy_profile)
-
-    node_utils = np.dot(strategy, action_utils)
-    
-    current_player_action_utils = action_utils[:, current_player]
-    current_player_node_util = node_utils[current_player]
-    
-    regrets_update = current_player_action_utils - current_player_node_util
-    node['regret_sum'] += regrets_update
-    
-    return node_utils
+
+    if s.current_player != traverser:
+        # Своя вероятность достижения оппонента уже учтена сэмплированием его действий
+        if offset >= 0:
+            table.accumulate(table.strategy_sum(offset, num_actions), strategy, num_actions)
+        i = _sample(strategy, num_actions)
+        state_apply(s, &actions[i], &undo)
+        value = _external(s, table, traverser, prune)
+        state_undo(s, &undo)
+        return value
+
+    for i in range(num_actions):
+        # Отсекаются только действия с нулевой вероятностью: node_util от этого не меняется
+        explored[i] = not (prune and strategy[i] == 0 and offset >= 0
+                           and table.regret_sum(offset)[i] < _prune_threshold)
+        if not explored[i]:
+            continue
+        state_apply(s, &actions[i], &undo)
+        action_utils[i] = _external(s, table, traverser, prune)
+        state_undo(s, &undo)
+        node_util += strategy[i] * action_utils[i]
+
+    for i in range(num_actions):
+        delta[i] = <float>(action_utils[i] - node_util) if explored[i] else 0.0
+    if offset >= 0:
+        _add_regrets(table, offset, delta, num_actions)
+    return node_util
+
+cpdef double external_sampling_traverse(GameState state, InfosetTable table, int traverser,
+                                        bint prune=False) except? -1e300:
+    """
+    Выборочная полезность traverser'а; регреты обновляются в его узлах, средняя стратегия — в узлах оппонента.
+    prune — отсекать действия traverser'а с регретом ниже порога configure_updates.
+    """
+    cdef CGameState s = state.s
+    return _external(&s, table, traverser, prune)
+
+# --- Outcome sampling ---
+cdef double _outcome(CGameState* s, InfosetTable table, int traverser,
+                     double pi_i, double pi_o, double sample_prob, double* tail) except? -1e300:
+    cdef CUndo undo
+    cdef double u
+    cdef double payoffs[NUM_PLAYERS]
+    _visit(s)
+    if state_is_terminal(s):
+        tail[0] = 1.0
+        _payoffs(s, payoffs)
+        return payoffs[traverser] / sample_prob
+
+    cdef CAction actions[MAX_STATE_ACTIONS]
+    cdef int num_actions = _legal_actions(s, actions)
+    if num_actions == 0:
+        state_apply(s, NULL, &undo)
+        u = _outcome(s, table, traverser, pi_i, pi_o, sample_prob, tail)
+        state_undo(s, &undo)
+        return u
+
+    cdef float strategy[MAX_STATE_ACTIONS]
+    cdef float sampling[MAX_STATE_ACTIONS]
+    cdef float delta[MAX_STATE_ACTIONS]
+    cdef int64_t offset = _current_strategy(table, s, num_actions, strategy)
+    cdef bint is_traverser = s.current_player == traverser
+    cdef double eps = OS_EXPLORATION if is_traverser else 0.0
+    cdef double w
+    cdef int i, a
+
+    for i in range(num_actions):
+        sampling[i] = <float>(eps / num_actions + (1.0 - eps) * strategy[i])
+    a = _sample(sampling, num_actions)
+
+    if is_traverser:
+        state_apply(s, &actions[a], &undo)
+        u = _outcome(s, table, traverser, pi_i * strategy[a], pi_o, sample_prob * sampling[a], tail)
+        state_undo(s, &undo)
+        w = u * pi_o
+        for i in range(num_actions):
+            if i == a:
+                delta[i] = <float>(w * tail[0] * (1.0 - strategy[a]))
+            else:
+                delta[i] = <float>(-w * tail[0] * strategy[a])
+        if offset >= 0:
+            _add_regrets(table, offset, delta, num_actions)
+    else:
+        for i in range(num_actions):
+            delta[i] = <float>(pi_o / sample_prob * strategy[i])
+        if offset >= 0:
+            table.accumulate(table.strategy_sum(offset, num_actions), delta, num_actions)
+        state_apply(s, &actions[a], &undo)
+        u = _outcome(s, table, traverser, pi_i, pi_o * strategy[a], sample_prob * sampling[a], tail)
+        state_undo(s, &undo)
+    tail[0] *= strategy[a]
+    return u
+
+cpdef tuple outcome_sampling_traverse(GameState state, InfosetTable table, int traverser,
+                                      double pi_i=1.0, double pi_o=1.0, double s=1.0):
+    """
+    Возвращает (u / s, tail), где u — выигрыш traverser'а в сэмплированном терминале,
+    s — вероятность сэмплирования траектории, tail — π(z|h) по стратегии σ.
+    """
+    cdef CGameState cs = state.s
+    cdef double tail = 1.0
+    cdef double u = _outcome(&cs, table, traverser, pi_i, pi_o, s, &tail)
+    return u, tail
+
+# --- Драйвер ---
+cpdef double run_iterations(InfosetTable table, int iterations, str mode='external', int start_iteration=0) except? -1e300:
+    """
+    Выполняет iterations итераций MCCFR на свежих раздачах; traverser чередуется по номеру итерации,
+    по нему же включается отсечение (configure_updates). Дисконтирование — apply_discount драйвера.
+    Возвращает среднюю выборочную полезность traverser'а.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {mode}")
+    cdef double total = 0.0, tail
+    cdef double utils[NUM_PLAYERS]
+    cdef double reach[NUM_PLAYERS]
+    cdef int t, traverser
+    cdef GameState root
+    cdef CGameState s
+    for t in range(start_iteration, start_iteration + iterations):
+        root = GameState()
+        s = root.s
+        traverser = t % NUM_PLAYERS
+        if mode == 'external':
+            total += _external(&s, table, traverser, _prune_iteration(t))
+        elif mode == 'outcome':
+            total += _outcome(&s, table, traverser, 1.0, 1.0, 1.0, &tail)
+        else:
+            reach[0] = reach[1] = 1.0
+            _full(&s, table, reach, utils)
+            total += utils[traverser]
+    return total / iterations if iterations > 0 else 0.0
@@ -1,4 +1,66 @@
-# mccfr_engine/ofc_game.pxd (v13 - добавлены объявления cdef методов)
+# mccfr_engine/ofc_game.pxd (v20 - эвристическое ранжирование действий)
+from libc.stdint cimport uint64_t, int32_t, uint8_t
+from hand_eval cimport HandResult
+
+cdef enum:
+    NUM_PLAYERS = 2
+    NUM_ROWS = 3
+    BOARD_SLOTS = 13
+    DECK_SIZE = 52
+    MAX_DEALT = 5
+    MAX_DISCARDS = 4
+    LAST_STREET = 5
+    MAX_HISTORY = 16
+    MAX_STATE_ACTIONS = 256   # 1-я улица: 3**5 = 243 кода
+    NUM_SUITS = 4
+    INFOSET_KEY_GROUPS = 8    # свои ряды, ряды оппонента, раздача, свои сбросы
+    INFOSET_KEY_WORDS = 2 + INFOSET_KEY_GROUPS
+
+# Ряды: 0 — top (слоты 0-2), 1 — middle (3-7), 2 — bottom (8-12). Пустой слот — 0.
+# Карты — int из card.py; row_mask хранит индексы карт (card_index, 0..51) битами.
+ctypedef struct CGameState:
+    int32_t cards[NUM_PLAYERS][BOARD_SLOTS]
+    uint64_t row_mask[NUM_PLAYERS][NUM_ROWS]
+    uint8_t row_count[NUM_PLAYERS][NUM_ROWS]
+    int32_t discards[NUM_PLAYERS][MAX_DISCARDS]
+    uint8_t num_discards[NUM_PLAYERS]
+    int32_t deck[DECK_SIZE]
+    uint8_t deck_pos
+    int32_t dealt[MAX_DEALT]
+    uint8_t num_dealt
+    uint8_t street, dealer, current_player, is_terminal
+    uint64_t rng
+
+# Действие: num_placed карт в абсолютные слоты + сброшенная карта (0 — без сброса)
+ctypedef struct CAction:
+    uint8_t num_placed
+    int32_t cards[MAX_DEALT]
+    uint8_t slots[MAX_DEALT]
+    int32_t discard
+
+# Всё, что нужно state_undo, чтобы откатить state_apply
+ctypedef struct CUndo:
+    CAction action
+    bint has_action
+    uint8_t street, current_player, is_terminal, deck_pos, num_dealt
+    int32_t dealt[MAX_DEALT]
+
+# --- C API состояния (без GIL, без выделений памяти) ---
+cdef int card_index(int32_t c) noexcept nogil
+cdef uint64_t rng_next(uint64_t* state) noexcept nogil
+cdef void state_init(CGameState* s, uint64_t seed) noexcept nogil
+cdef bint state_is_terminal(const CGameState* s) noexcept nogil
+cdef int state_num_action_codes(const CGameState* s) noexcept nogil
+cdef int state_decode_action(const CGameState* s, int code, CAction* out) noexcept nogil
+cdef int state_legal_actions(const CGameState* s, CAction* out, int* codes=*) noexcept nogil
+cdef void state_apply(CGameState* s, const CAction* a, CUndo* u) noexcept nogil
+cdef void state_undo(CGameState* s, const CUndo* u) noexcept nogil
+cdef void state_canonical_suits(const CGameState* s, uint8_t* perm) noexcept nogil
+cdef int state_canonical_dealt(const CGameState* s, int32_t* cards) noexcept nogil
+cdef void state_infoset_words(const CGameState* s, uint64_t* out) noexcept nogil
+cdef uint64_t state_infoset_hash(const CGameState* s) noexcept nogil
+cdef void state_payoffs(const CGameState* s, double* out) noexcept nogil
+cdef double state_heuristic_value(const CGameState* s, int p, double foul_penalty) noexcept nogil
 
 cdef class Deck:
     cdef public list cards
@@ -14,18 +76,29 @@ cdef class Board:
     cpdef get_available_slots(self)
     cpdef bint is_foul(self)
     cpdef to_int_tuple(self)
+    cpdef int get_total_royalty(self)
+    cdef void _load(self, const int32_t* cards)
+    cdef HandResult _evaluate_row(self, int row)
 
 cdef class GameState:
-    cdef public int players, street, dealer, current_player
-    cdef public list boards, discards
-    cdef public list dealt_cards
-    cdef public Deck deck
-    cdef public bint _is_terminal
-    # Объявляем внутренний C-метод
-    cdef _handle_deal(self)
-    # Объявляем публичные методы
+    cdef CGameState s
+    cdef CUndo history[MAX_HISTORY]
+    cdef int history_len
+    # Публичные методы
     cpdef bint is_terminal(self)
     cpdef get_payoffs(self)
     cpdef list get_legal_actions(self)
+    cpdef list get_legal_action_codes(self)
+    cpdef list rank_actions(self, double foul_penalty)
+    cpdef tuple decode_action(self, int code)
+    cpdef int encode_action(self, action) except -1
     cpdef apply_action(self, action)
+    cpdef apply_action_inplace(self, action)
+    cpdef undo_action(self)
     cpdef tuple get_infoset_key(self)
+    cpdef tuple canonical_suit_map(self)
+    cpdef uint64_t get_infoset_hash(self)
+    cpdef dict to_dict(self)
+    # Преобразование действий Python <-> C
+    cdef int _to_c_action(self, object action, CAction* out) except -1
+    cdef tuple _from_c_action(self, const CAction* a)
@@ -1,15 +1,467 @@
-# mccfr_engine/ofc_game.pyx (v13 - правильные cpdef)
-import random
-import itertools
-from typing import List, Tuple, Set, Optional, Dict
-from collections import Counter
-from libc.stdlib cimport rand, RAND_MAX
+# mccfr_engine/ofc_game.pyx (v22 - эвристическое ранжирование действий на C API)
+"""
+Состояние игры OFC Pineapple.
+
+Всё состояние лежит в C-структуре CGameState (ofc_game.pxd): карты досок по слотам,
+битовые маски рядов по индексам карт, колода-массив с курсором и собственный
+xorshift-ГСЧ. state_apply/state_undo меняют структуру на месте, поэтому обход дерева
+через C API (state_*) не выделяет память в узлах. Действия перечисляются на уровне
+рядов (какая карта в какой ряд, какая сбрасывается) в каноническом порядке и имеют
+компактный целочисленный код (state_decode_action). Ключ инфосета канонизирует масти
+(state_canonical_suits) и упакован в фиксированное число слов; порядок раздачи для кодов
+действий берётся в тех же канонических мастях. Классы GameState/Board/Deck —
+обёртки с прежним Python API; Board и Deck строятся из структуры по запросу.
+"""
+from libc.stdint cimport uint64_t, uint32_t, int32_t, uint16_t, uint8_t
+from libc.string cimport memset
 
 import card
 import evaluator
 
 from ofc_game cimport Deck, Board
+from infoset_table cimport hash_combine, HASH_TAG_TUPLE
+from hand_eval cimport HandResult, evaluate_row, cached_row, ROW_TOP, ROW_MIDDLE, ROW_BOTTOM
+
+ROW_NAMES = ('top', 'middle', 'bottom')
+cdef dict ROW_INDEX = {name: i for i, name in enumerate(ROW_NAMES)}
+cdef uint8_t ROW_START[NUM_ROWS]
+cdef uint8_t ROW_SIZE[NUM_ROWS]
+cdef uint8_t SLOT_ROW[BOARD_SLOTS]
+ROW_START[:] = [0, 3, 8]
+ROW_SIZE[:] = [3, 5, 5]
+SLOT_ROW[:] = [0, 0, 0, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2]
+cdef int SCOOP_BONUS = evaluator.SCOOP_BONUS
+
+# Карта по индексу rank * 4 + suit_idx (масти s, h, d, c)
+cdef int32_t CARD_BY_INDEX[DECK_SIZE]
+for _i, _c in enumerate([card.Card.from_str(r + s) for r in card.STR_RANKS for s in 'shdc']):
+    CARD_BY_INDEX[_i] = _c
+
+# --- ГСЧ ---
+cdef uint64_t DEFAULT_SEED = 0x9E3779B97F4A7C15ULL
+cdef uint64_t _seed_rng = DEFAULT_SEED   # выдаёт сиды новым состояниям и тасует Deck
+
+cpdef void seed_deals(uint64_t seed):
+    """Сид ГСЧ раздач (сиды новых GameState) в текущем процессе."""
+    global _seed_rng
+    _seed_rng = seed if seed != 0 else DEFAULT_SEED
+
+cpdef uint64_t get_deal_state():
+    return _seed_rng
+
+cpdef void set_deal_state(uint64_t state):
+    seed_deals(state)
+
+cdef uint64_t rng_next(uint64_t* state) noexcept nogil:
+    # xorshift64*
+    cdef uint64_t x = state[0]
+    x ^= x >> 12
+    x ^= x << 25
+    x ^= x >> 27
+    state[0] = x
+    return x * 0x2545F4914F6CDD1DULL
+
+cdef inline uint32_t rng_below(uint64_t* state, uint32_t n) noexcept nogil:
+    return <uint32_t>(((rng_next(state) >> 32) * n) >> 32)
+
+# --- C API состояния ---
+cdef int card_index(int32_t c) noexcept nogil:
+    cdef int suit = (c >> 12) & 0xF
+    cdef int suit_idx = 0 if suit == 1 else (1 if suit == 2 else (2 if suit == 4 else 3))
+    return ((c >> 8) & 0xF) * 4 + suit_idx
+
+cdef void _deal(CGameState* s) noexcept nogil:
+    cdef int n = 5 if s.street == 1 else 3
+    cdef int available = DECK_SIZE - s.deck_pos
+    cdef int i
+    if available < n:
+        s.is_terminal = 1
+        n = available
+    for i in range(n):
+        s.dealt[i] = s.deck[s.deck_pos + i]
+    s.num_dealt = n
+    s.deck_pos += n
+
+cdef void state_init(CGameState* s, uint64_t seed) noexcept nogil:
+    cdef int i, j
+    cdef int32_t tmp
+    memset(s, 0, sizeof(CGameState))
+    s.rng = seed if seed != 0 else DEFAULT_SEED
+    for i in range(DECK_SIZE):
+        s.deck[i] = CARD_BY_INDEX[i]
+    for i in range(DECK_SIZE - 1, 0, -1):
+        j = rng_below(&s.rng, i + 1)
+        tmp = s.deck[i]; s.deck[i] = s.deck[j]; s.deck[j] = tmp
+    s.dealer = rng_below(&s.rng, NUM_PLAYERS)
+    s.current_player = (s.dealer + 1) % NUM_PLAYERS
+    s.street = 1
+    _deal(s)
+
+cdef bint state_is_terminal(const CGameState* s) noexcept nogil:
+    cdef int p
+    if s.is_terminal or s.street > LAST_STREET:
+        return True
+    for p in range(NUM_PLAYERS):
+        if s.row_count[p][0] + s.row_count[p][1] + s.row_count[p][2] == BOARD_SLOTS:
+            return True
+    return False
+
+# --- Канонический ключ инфосета (изоморфизм мастей) ---
+# Группы карт ключа: свои ряды 0-2, ряды оппонента 3-5, раздача 6, свои сбросы 7
+cdef enum:
+    GROUP_DEALT = 2 * NUM_ROWS
+    GROUP_DISCARDS = GROUP_DEALT + 1
+    MAX_KEY_CARDS = 2 * BOARD_SLOTS + MAX_DEALT + MAX_DISCARDS
+
+cdef inline int _rank(int32_t c) noexcept nogil:
+    return (c >> 8) & 0xF
+
+cdef int _key_cards(const CGameState* s, int32_t* cards, uint8_t* groups) noexcept nogil:
+    # Все карты, видимые текущему игроку, с номером группы; возвращает их число
+    cdef int p = s.current_player, q, i, n = 0
+    for q in range(NUM_PLAYERS):
+        for i in range(BOARD_SLOTS):
+            if s.cards[(p + q) % NUM_PLAYERS][i] != 0:
+                cards[n] = s.cards[(p + q) % NUM_PLAYERS][i]
+                groups[n] = q * NUM_ROWS + SLOT_ROW[i]
+                n += 1
+    for i in range(s.num_dealt):
+        cards[n] = s.dealt[i]
+        groups[n] = GROUP_DEALT
+        n += 1
+    for i in range(s.num_discards[p]):
+        cards[n] = s.discards[p][i]
+        groups[n] = GROUP_DISCARDS
+        n += 1
+    return n
+
+cdef void state_canonical_suits(const CGameState* s, uint8_t* perm) noexcept nogil:
+    """
+    perm[масть] — каноническая масть. Сигнатура масти — маски её рангов по группам ключа;
+    масти упорядочиваются по убыванию сигнатур, при равенстве — по исходному номеру
+    (такие масти взаимозаменяемы, и ключ от выбора между ними не зависит).
+    """
+    cdef uint16_t sig[NUM_SUITS][INFOSET_KEY_GROUPS]
+    cdef int32_t cards[MAX_KEY_CARDS]
+    cdef uint8_t groups[MAX_KEY_CARDS]
+    cdef int order[NUM_SUITS]
+    cdef int n = _key_cards(s, cards, groups), i, j, g, v
+    cdef bint greater
+    memset(sig, 0, sizeof(sig))
+    for i in range(n):
+        sig[card_index(cards[i]) & 3][groups[i]] |= 1 << _rank(cards[i])
+    for i in range(NUM_SUITS):
+        order[i] = i
+    for i in range(1, NUM_SUITS):
+        v = order[i]
+        j = i - 1
+        while j >= 0:
+            greater = False
+            for g in range(INFOSET_KEY_GROUPS):
+                if sig[v][g] != sig[order[j]][g]:
+                    greater = sig[v][g] > sig[order[j]][g]
+                    break
+            if not greater:
+                break
+            order[j + 1] = order[j]
+            j -= 1
+        order[j + 1] = v
+    for i in range(NUM_SUITS):
+        perm[order[i]] = i
+
+cdef inline int _canonical_index(int32_t c, const uint8_t* perm) noexcept nogil:
+    return _rank(c) * NUM_SUITS + perm[card_index(c) & 3]
+
+cdef void state_infoset_words(const CGameState* s, uint64_t* out) noexcept nogil:
+    """
+    Упакованный канонический ключ из INFOSET_KEY_WORDS слов: улица, игрок и 52-битные маски
+    карт каждой группы (бит rank * 4 + каноническая масть). Порядок карт внутри ряда и
+    перестановка мастей на ключ не влияют.
+    """
+    cdef int32_t cards[MAX_KEY_CARDS]
+    cdef uint8_t groups[MAX_KEY_CARDS]
+    cdef uint8_t perm[NUM_SUITS]
+    cdef int n = _key_cards(s, cards, groups), i
+    state_canonical_suits(s, perm)
+    out[0] = s.street
+    out[1] = s.current_player
+    for i in range(INFOSET_KEY_GROUPS):
+        out[2 + i] = 0
+    for i in range(n):
+        out[2 + groups[i]] |= (<uint64_t>1) << _canonical_index(cards[i], perm)
+
+cdef uint64_t state_infoset_hash(const CGameState* s) noexcept nogil:
+    """То же, что hash_infoset_key(GameState.get_infoset_key()), но без построения кортежа."""
+    cdef uint64_t words[INFOSET_KEY_WORDS]
+    cdef uint64_t h = hash_combine(0, HASH_TAG_TUPLE ^ INFOSET_KEY_WORDS)
+    cdef int i
+    state_infoset_words(s, words)
+    for i in range(INFOSET_KEY_WORDS):
+        h = hash_combine(h, words[i])
+    return h if h != 0 else 1
+
+cdef inline int _num_placed(const CGameState* s) noexcept nogil:
+    return s.num_dealt if s.street == 1 else s.num_dealt - 1
+
+cdef int state_num_action_codes(const CGameState* s) noexcept nogil:
+    """Размер пространства кодов действий (не все коды легальны — см. state_decode_action)."""
+    if state_is_terminal(s) or s.num_dealt == 0:
+        return 0
+    cdef int i, n = 1
+    for i in range(_num_placed(s)):
+        n *= NUM_ROWS
+    return n if s.street == 1 else n * s.num_dealt
+
+cdef int state_canonical_dealt(const CGameState* s, int32_t* cards) noexcept nogil:
+    """Карты раздачи в каноническом порядке (по каноническому индексу); возвращает их число."""
+    cdef uint8_t perm[NUM_SUITS]
+    cdef int i, j
+    cdef int32_t v
+    state_canonical_suits(s, perm)
+    for i in range(s.num_dealt):
+        v = s.dealt[i]
+        j = i - 1
+        while j >= 0 and _canonical_index(cards[j], perm) > _canonical_index(v, perm):
+            cards[j + 1] = cards[j]
+            j -= 1
+        cards[j + 1] = v
+    return s.num_dealt
+
+cdef int _decode_action(const CGameState* s, const int32_t* cards, int code, CAction* out) noexcept nogil:
+    # cards — раздача в каноническом порядке (state_canonical_dealt)
+    cdef int p = s.current_player
+    cdef int d = s.num_dealt, k = _num_placed(s)
+    cdef int rows[MAX_DEALT]
+    cdef uint8_t next_slot[NUM_ROWS]
+    cdef int i, j, row, discard = -1
+
+    for i in range(k - 1, -1, -1):
+        rows[i] = code % NUM_ROWS
+        code //= NUM_ROWS
+    if s.street != 1:
+        discard = code
+
+    for row in range(NUM_ROWS):
+        next_slot[row] = ROW_START[row]
+    out.num_placed = k
+    out.discard = cards[discard] if discard >= 0 else 0
+    j = 0
+    for i in range(d):
+        if i == discard:
+            continue
+        row = rows[j]
+        while next_slot[row] < ROW_START[row] + ROW_SIZE[row] and s.cards[p][next_slot[row]] != 0:
+            next_slot[row] += 1
+        if next_slot[row] == ROW_START[row] + ROW_SIZE[row]:
+            return -1
+        out.cards[j] = cards[i]
+        out.slots[j] = next_slot[row]
+        next_slot[row] += 1
+        j += 1
+    return 0
+
+cdef int state_decode_action(const CGameState* s, int code, CAction* out) noexcept nogil:
+    """
+    Действие по коду: code = ((discard * 3 + row_0) * 3 + row_1) * 3 + ..., где карты раздачи
+    взяты в каноническом порядке (state_canonical_dealt), discard — позиция сброшенной карты
+    (на 1-й улице её нет), row_i — ряд i-й оставленной карты. Карты занимают младшие свободные
+    слоты своего ряда. Поэтому код означает одно и то же во всех состояниях с одинаковым
+    каноническим ключом. Возвращает 0 или -1, если код вне диапазона или ряд переполнен.
+    """
+    if code < 0 or code >= state_num_action_codes(s):
+        return -1
+    cdef int32_t cards[MAX_DEALT]
+    state_canonical_dealt(s, cards)
+    return _decode_action(s, cards, code, out)
+
+cdef int state_legal_actions(const CGameState* s, CAction* out, int* codes=NULL) noexcept nogil:
+    """
+    Все различимые раскладки раздачи по рядам (и выбор сброса) в порядке возрастания кода:
+    порядок слотов внутри ряда не важен, поэтому перестановки слотов не перебираются.
+    codes, если задан, получает код каждого действия.
+    """
+    cdef int32_t cards[MAX_DEALT]
+    cdef int code, n = 0, total = state_num_action_codes(s)
+    if total == 0:
+        return 0
+    state_canonical_dealt(s, cards)
+    for code in range(total):
+        if _decode_action(s, cards, code, &out[n]) == 0:
+            if codes != NULL:
+                codes[n] = code
+            n += 1
+    return n
+
+cdef void state_apply(CGameState* s, const CAction* a, CUndo* u) noexcept nogil:
+    """Применяет действие a (NULL — пас) на месте; u запоминает всё для state_undo."""
+    cdef int p = s.current_player
+    cdef int i, slot, row
+    u.has_action = a != NULL
+    if a != NULL:
+        u.action = a[0]
+    u.street = s.street
+    u.current_player = s.current_player
+    u.is_terminal = s.is_terminal
+    u.deck_pos = s.deck_pos
+    u.num_dealt = s.num_dealt
+    for i in range(s.num_dealt):
+        u.dealt[i] = s.dealt[i]
+
+    if a != NULL:
+        for i in range(a.num_placed):
+            slot = a.slots[i]
+            row = SLOT_ROW[slot]
+            s.cards[p][slot] = a.cards[i]
+            s.row_mask[p][row] |= (<uint64_t>1) << card_index(a.cards[i])
+            s.row_count[p][row] += 1
+        if a.discard != 0:
+            s.discards[p][s.num_discards[p]] = a.discard
+            s.num_discards[p] += 1
+
+    if s.current_player == s.dealer:
+        s.street += 1
+    s.current_player = (s.current_player + 1) % NUM_PLAYERS
+    if s.street > LAST_STREET:
+        s.is_terminal = 1
+    else:
+        _deal(s)
+
+cdef void state_undo(CGameState* s, const CUndo* u) noexcept nogil:
+    cdef int p = u.current_player
+    cdef int i, slot, row
+    s.street = u.street
+    s.current_player = u.current_player
+    s.is_terminal = u.is_terminal
+    s.deck_pos = u.deck_pos
+    s.num_dealt = u.num_dealt
+    for i in range(u.num_dealt):
+        s.dealt[i] = u.dealt[i]
+    if u.has_action:
+        for i in range(u.action.num_placed):
+            slot = u.action.slots[i]
+            row = SLOT_ROW[slot]
+            s.cards[p][slot] = 0
+            s.row_mask[p][row] &= ~((<uint64_t>1) << card_index(u.action.cards[i]))
+            s.row_count[p][row] -= 1
+        if u.action.discard != 0:
+            s.num_discards[p] -= 1
 
+cdef void state_payoffs(const CGameState* s, double* out) noexcept nogil:
+    """
+    Как evaluator.calculate_payoffs, но за один проход: каждый из шести рядов оценивается
+    ровно один раз (через кеш hand_eval.cached_row), фол, линии, скуп и роялти — из этих результатов.
+    """
+    cdef HandResult res[NUM_PLAYERS][NUM_ROWS]
+    cdef int32_t buf[MAX_DEALT]
+    cdef bint foul[NUM_PLAYERS]
+    cdef int royalty[NUM_PLAYERS]
+    cdef int p, r, i, n, line = 0
+    for p in range(NUM_PLAYERS):
+        royalty[p] = 0
+        for r in range(NUM_ROWS):
+            n = 0
+            for i in range(ROW_START[r], ROW_START[r] + ROW_SIZE[r]):
+                if s.cards[p][i] != 0:
+                    buf[n] = s.cards[p][i]
+                    n += 1
+            res[p][r] = cached_row(buf, n, r, s.row_mask[p][r])
+            royalty[p] += res[p][r].royalty
+        foul[p] = (s.row_count[p][ROW_TOP] == ROW_SIZE[ROW_TOP] and s.row_count[p][ROW_MIDDLE] == ROW_SIZE[ROW_MIDDLE]
+                   and s.row_count[p][ROW_BOTTOM] == ROW_SIZE[ROW_BOTTOM]
+                   and (res[p][ROW_TOP].rank < res[p][ROW_MIDDLE].rank or res[p][ROW_MIDDLE].rank < res[p][ROW_BOTTOM].rank))
+
+    if foul[0] and foul[1]:
+        out[0] = out[1] = 0.0
+        return
+    if foul[0]:
+        out[1] = SCOOP_BONUS + royalty[1]
+        out[0] = -out[1]
+        return
+    if foul[1]:
+        out[0] = SCOOP_BONUS + royalty[0]
+        out[1] = -out[0]
+        return
+
+    for r in range(NUM_ROWS):
+        if res[0][r].rank < res[1][r].rank:
+            line += 1
+        elif res[0][r].rank > res[1][r].rank:
+            line -= 1
+    if line == NUM_ROWS:
+        line += SCOOP_BONUS
+    elif line == -NUM_ROWS:
+        line -= SCOOP_BONUS
+    out[0] = line + royalty[0] - royalty[1]
+    out[1] = -out[0]
+
+# --- Эвристическая оценка доски (evaluate.HeuristicAgent) ---
+cdef enum:
+    WHEEL_RANKS = 0x100F     # A-2-3-4-5: ранги 0-3 и 12
+
+cdef inline bint _is_straight(uint16_t ranks) noexcept nogil:
+    # Пять разных рангов подряд (или колесо); ranks — битовая маска рангов
+    cdef uint16_t low = ranks & (~ranks + 1)
+    return ranks == WHEEL_RANKS or ranks == <uint16_t>(low * 0x1F)
+
+cdef HandResult _estimate_row(const CGameState* s, int p, int row) noexcept nogil:
+    """
+    Ряд row игрока p через cached_row. Незаполненный ряд дополняется самыми младшими
+    картами, не дающими пар, стрита и флеша: оценивается уже собранная комбинация.
+    """
+    cdef int32_t buf[MAX_DEALT]
+    cdef int free_ranks[13]
+    cdef int fill[MAX_DEALT]
+    cdef int suits[NUM_SUITS]
+    cdef int n = 0, num_free = 0, missing, common = 0, i, j, x
+    cdef uint16_t ranks = 0, fill_ranks
+    cdef uint64_t mask = s.row_mask[p][row]
+    memset(suits, 0, sizeof(suits))
+    for i in range(ROW_START[row], ROW_START[row] + ROW_SIZE[row]):
+        if s.cards[p][i] != 0:
+            buf[n] = s.cards[p][i]
+            ranks |= 1 << _rank(buf[n])
+            suits[card_index(buf[n]) & 3] += 1
+            n += 1
+    missing = ROW_SIZE[row] - n
+    if missing > 0:
+        for i in range(13):
+            if not (ranks >> i) & 1:
+                free_ranks[num_free] = i
+                num_free += 1
+        fill_ranks = 0
+        for i in range(missing):
+            fill[i] = free_ranks[i]
+            fill_ranks |= 1 << fill[i]
+        j = missing
+        while _is_straight(ranks | fill_ranks) and j < num_free:
+            fill_ranks ^= (1 << fill[missing - 1]) | (1 << free_ranks[j])
+            fill[missing - 1] = free_ranks[j]
+            j += 1
+        # Масти добавки начинаются с отличной от самой частой масти ряда: флеша не возникает
+        for x in range(1, NUM_SUITS):
+            if suits[x] > suits[common]:
+                common = x
+        for i in range(missing):
+            x = i % NUM_SUITS
+            x = (x + (x >= common)) if x < NUM_SUITS - 1 else common
+            buf[n] = CARD_BY_INDEX[fill[i] * 4 + x]
+            mask |= (<uint64_t>1) << (fill[i] * 4 + x)
+            n += 1
+    return cached_row(buf, n, row, mask)
+
+cdef double state_heuristic_value(const CGameState* s, int p, double foul_penalty) noexcept nogil:
+    """
+    Роялти рядов игрока p (незаполненные — по _estimate_row) минус foul_penalty за каждую
+    единицу ранга, на которую top сильнее middle или middle сильнее bottom (сравнение рангов
+    то же, что у фола в state_payoffs).
+    """
+    cdef HandResult top = _estimate_row(s, p, ROW_TOP)
+    cdef HandResult middle = _estimate_row(s, p, ROW_MIDDLE)
+    cdef HandResult bottom = _estimate_row(s, p, ROW_BOTTOM)
+    cdef int violation = max(0, middle.rank - top.rank) + max(0, bottom.rank - middle.rank)
+    return top.royalty + middle.royalty + bottom.royalty - foul_penalty * violation
+
+# --- Python-обёртки ---
 cdef class Deck:
     def __cinit__(self, list cards=None):
         if cards is not None:
@@ -22,7 +474,7 @@ cdef class Deck:
         cdef int i, j, n
         n = len(self.cards)
         for i in range(n - 1, 0, -1):
-            j = <int>(rand() / (RAND_MAX + 1.0) * (i + 1))
+            j = rng_below(&_seed_rng, i + 1)
             self.cards[i], self.cards[j] = self.cards[j], self.cards[i]
 
     cdef deal(self, int n):
@@ -33,7 +485,13 @@ cdef class Deck:
 cdef class Board:
     def __cinit__(self):
         self.rows = {'top': [None]*3, 'middle': [None]*5, 'bottom': [None]*5}
-    
+
+    cdef void _load(self, const int32_t* cards):
+        cdef int r, i
+        for r in range(NUM_ROWS):
+            self.rows[ROW_NAMES[r]] = [cards[i] if cards[i] != 0 else None
+                                       for i in range(ROW_START[r], ROW_START[r] + ROW_SIZE[r])]
+
     cpdef get_all_cards(self): # ИСПРАВЛЕНО: def -> cpdef
         all_c = set()
         for row in self.rows.values():
@@ -53,12 +511,21 @@ cdef class Board:
                     slots.append((r, i))
         return slots
 
+    cdef HandResult _evaluate_row(self, int row):
+        cdef int32_t buf[MAX_DEALT]
+        cdef int n = 0
+        for c in self.rows[ROW_NAMES[row]]:
+            if c is not None:
+                buf[n] = c
+                n += 1
+        return evaluate_row(buf, n, row)
+
     cpdef bint is_foul(self): # ИСПРАВЛЕНО: def -> cpdef
         if len(self.get_row_cards('top')) != 3 or len(self.get_row_cards('middle')) != 5 or len(self.get_row_cards('bottom')) != 5:
             return False
-        top_rank, _, _ = evaluator.get_hand_rank(self.get_row_cards('top'))
-        mid_rank, _, _ = evaluator.get_hand_rank(self.get_row_cards('middle'))
-        bot_rank, _, _ = evaluator.get_hand_rank(self.get_row_cards('bottom'))
+        cdef int32_t top_rank = self._evaluate_row(ROW_TOP).rank
+        cdef int32_t mid_rank = self._evaluate_row(ROW_MIDDLE).rank
+        cdef int32_t bot_rank = self._evaluate_row(ROW_BOTTOM).rank
         return (top_rank < mid_rank) or (mid_rank < bot_rank)
 
     cpdef to_int_tuple(self): # ИСПРАВЛЕНО: def -> cpdef
@@ -68,103 +535,274 @@ cdef class Board:
                 t.append(c)
         return tuple(t)
 
+    cpdef int get_total_royalty(self): # Используется evaluator.calculate_payoffs
+        cdef int row, total = 0
+        for row in range(NUM_ROWS):
+            total += self._evaluate_row(row).royalty
+        return total
+
 cdef class GameState:
-    def __cinit__(self, GameState from_state=None):
-        if from_state:
-            self.players = from_state.players
-            self.boards = [Board() for _ in range(self.players)]
-            for i in range(self.players):
-                self.boards[i].rows = {k: list(v) for k, v in from_state.boards[i].rows.items()}
-            self.discards = [list(d) for d in from_state.discards]
-            self.dealt_cards = from_state.dealt_cards
-            self.street = from_state.street
-            self.dealer = from_state.dealer
-            self.current_player = from_state.current_player
-            self.deck = from_state.deck
-            self._is_terminal = from_state._is_terminal
+    def __cinit__(self, GameState from_state=None, seed=None):
+        self.history_len = 0
+        if from_state is not None:
+            self.s = from_state.s
         else:
-            self.players = 2
-            self.boards = [Board() for _ in range(self.players)]
-            self.discards = [[] for _ in range(self.players)]
-            self.dealt_cards = None
-            self.street = 1
-            self.dealer = <int>(rand() / (RAND_MAX + 1.0) * self.players)
-            self.current_player = (self.dealer + 1) % self.players
-            self.deck = Deck()
-            self._is_terminal = False
-            self._handle_deal()
-
-    cdef _handle_deal(self):
-        cdef int num_to_deal = 5 if self.street == 1 else 3
-        dealt, remaining = self.deck.deal(num_to_deal)
-        self.dealt_cards = dealt
-        self.deck = Deck(remaining)
-        if not self.dealt_cards or len(self.dealt_cards) < num_to_deal:
-             self._is_terminal = True
+            state_init(&self.s, <uint64_t>seed if seed is not None else rng_next(&_seed_rng))
+
+    # Прежние атрибуты — теперь только для чтения, собираются из структуры
+    @property
+    def players(self): return NUM_PLAYERS
+    @property
+    def street(self): return self.s.street
+    @property
+    def dealer(self): return self.s.dealer
+    @property
+    def current_player(self): return self.s.current_player
+    @property
+    def _is_terminal(self): return bool(self.s.is_terminal)
+
+    @property
+    def boards(self):
+        cdef int p
+        cdef Board b
+        result = []
+        for p in range(NUM_PLAYERS):
+            b = Board()
+            b._load(self.s.cards[p])
+            result.append(b)
+        return result
+
+    @property
+    def discards(self):
+        return [[self.s.discards[p][i] for i in range(self.s.num_discards[p])] for p in range(NUM_PLAYERS)]
+
+    @property
+    def dealt_cards(self):
+        return [self.s.dealt[i] for i in range(self.s.num_dealt)]
+
+    @property
+    def deck(self):
+        return Deck([self.s.deck[i] for i in range(self.s.deck_pos, DECK_SIZE)])
 
     cpdef bint is_terminal(self): # ИСПРАВЛЕНО: def -> cpdef
-        if self._is_terminal: return True
-        if self.street > 5: return True
-        for b in self.boards:
-            if len(b.get_all_cards()) == 13:
-                return True
-        return False
+        return state_is_terminal(&self.s)
 
     cpdef get_payoffs(self): # ИСПРАВЛЕНО: def -> cpdef
-        return evaluator.calculate_payoffs(self.boards[0], self.boards[1])
+        cdef double out[NUM_PLAYERS]
+        state_payoffs(&self.s, out)
+        return out[0], out[1]
 
     cpdef list get_legal_actions(self): # ИСПРАВЛЕНО: def -> cpdef
-        if self.is_terminal() or not self.dealt_cards: return []
-        
-        cards_to_place_options = []
-        if self.street == 1:
-            cards_to_place_options.append((self.dealt_cards, None))
-        else:
-            cards_to_place = self.dealt_cards[:-1]
-            discarded_card = self.dealt_cards[-1]
-            cards_to_place_options.append((cards_to_place, discarded_card))
-
-        actions = set()
-        available_slots = self.boards[self.current_player].get_available_slots()
-        
-        for cards_to_place, discarded_card in cards_to_place_options:
-            if len(available_slots) < len(cards_to_place): continue
-            
-            limit = 20 if len(cards_to_place) > 2 else 60
-            slot_permutations = list(itertools.permutations(available_slots, len(cards_to_place)))
-            if len(slot_permutations) > limit:
-                slot_permutations = random.sample(slot_permutations, limit)
-
-            for slots in slot_permutations:
-                placement = tuple(zip(cards_to_place, slots))
-                actions.add((placement, discarded_card))
-        
-        return list(actions)
+        cdef CAction actions[MAX_STATE_ACTIONS]
+        cdef int i, n = state_legal_actions(&self.s, actions)
+        return [self._from_c_action(&actions[i]) for i in range(n)]
+
+    cpdef list get_legal_action_codes(self):
+        """Коды действий get_legal_actions() в том же порядке."""
+        cdef CAction actions[MAX_STATE_ACTIONS]
+        cdef int codes[MAX_STATE_ACTIONS]
+        cdef int i, n = state_legal_actions(&self.s, actions, codes)
+        return [codes[i] for i in range(n)]
+
+    cpdef list rank_actions(self, double foul_penalty):
+        """
+        Индексы get_legal_action_codes() по убыванию state_heuristic_value доски ходящего после
+        действия (при равенстве — по порядку). Каждое действие применяется и откатывается на
+        месте (state_apply/state_undo), Python-объекты на кандидата не создаются.
+        """
+        cdef CAction actions[MAX_STATE_ACTIONS]
+        cdef double scores[MAX_STATE_ACTIONS]
+        cdef int order[MAX_STATE_ACTIONS]
+        cdef CUndo undo
+        cdef int p = self.s.current_player
+        cdef int i, j, n = state_legal_actions(&self.s, actions)
+        with nogil:
+            for i in range(n):
+                state_apply(&self.s, &actions[i], &undo)
+                scores[i] = state_heuristic_value(&self.s, p, foul_penalty)
+                state_undo(&self.s, &undo)
+                # Вставка с сохранением порядка равных оценок
+                j = i
+                while j > 0 and scores[order[j - 1]] < scores[i]:
+                    order[j] = order[j - 1]
+                    j -= 1
+                order[j] = i
+        return [order[i] for i in range(n)]
+
+    cpdef tuple decode_action(self, int code):
+        cdef CAction a
+        if state_decode_action(&self.s, code, &a) != 0:
+            raise ValueError(f"Illegal action code: {code}")
+        return self._from_c_action(&a)
+
+    cpdef int encode_action(self, action) except -1:
+        """Код действия в формате get_legal_actions(); конкретные слоты внутри ряда не учитываются."""
+        placement, discarded_card = action
+        cdef int code = 0
+        cdef bint has_discard = self.s.street != 1
+        cdef int32_t cards[MAX_DEALT]
+        cdef int i, n = state_canonical_dealt(&self.s, cards)
+        dealt = [cards[i] for i in range(n)]
+        rows = {c: ROW_INDEX[row_name] for c, (row_name, _) in placement}
+        if len(rows) != _num_placed(&self.s) or (has_discard and discarded_card not in dealt):
+            raise ValueError(f"Action does not match dealt cards: {action}")
+        if has_discard:
+            code = dealt.index(discarded_card)
+        for c in dealt:
+            if has_discard and c == discarded_card:
+                continue
+            if c not in rows:
+                raise ValueError(f"Action does not match dealt cards: {action}")
+            code = code * NUM_ROWS + rows[c]
+        return code
+
+    cdef tuple _from_c_action(self, const CAction* a):
+        cdef int i, row
+        placement = []
+        for i in range(a.num_placed):
+            row = SLOT_ROW[a.slots[i]]
+            placement.append((a.cards[i], (ROW_NAMES[row], a.slots[i] - ROW_START[row])))
+        return tuple(placement), (a.discard if a.discard != 0 else None)
+
+    cdef int _to_c_action(self, object action, CAction* out) except -1:
+        placement, discarded_card = action
+        cdef int n = 0, row, idx, slot
+        for c, (row_name, idx) in placement:
+            if n >= MAX_DEALT:
+                raise ValueError("Too many cards in action")
+            row = ROW_INDEX[row_name]
+            if not 0 <= idx < ROW_SIZE[row]:
+                raise ValueError(f"Invalid slot: {row_name}[{idx}]")
+            slot = ROW_START[row] + idx
+            if self.s.cards[self.s.current_player][slot] != 0:
+                raise ValueError(f"Slot is occupied: {row_name}[{idx}]")
+            out.cards[n] = c
+            out.slots[n] = slot
+            n += 1
+        out.num_placed = n
+        out.discard = discarded_card if discarded_card is not None else 0
+        return 0
 
     cpdef apply_action(self, action): # ИСПРАВЛЕНО: def -> cpdef
-        new_state = GameState(from_state=self)
-        
-        if action:
-            placement, discarded_card = action
-            for c, (row, idx) in placement:
-                new_state.boards[new_state.current_player].rows[row][idx] = c
-            if discarded_card is not None:
-                new_state.discards[new_state.current_player].append(discarded_card)
-
-        if new_state.current_player == new_state.dealer:
-            new_state.street += 1
-        new_state.current_player = (new_state.current_player + 1) % new_state.players
-        
-        if new_state.street > 5:
-            new_state._is_terminal = True
-        else:
-            new_state._handle_deal()
+        cdef GameState new_state = GameState(from_state=self)
+        new_state.apply_action_inplace(action)
+        new_state.history_len = 0
         return new_state
 
+    cpdef apply_action_inplace(self, action):
+        """Применяет действие (кортеж или код) к этому состоянию; откатывается через undo_action()."""
+        cdef CAction a
+        if self.history_len >= MAX_HISTORY:
+            raise IndexError("Action history is full")
+        if isinstance(action, int):
+            if state_decode_action(&self.s, action, &a) != 0:
+                raise ValueError(f"Illegal action code: {action}")
+            state_apply(&self.s, &a, &self.history[self.history_len])
+        elif action:
+            self._to_c_action(action, &a)
+            state_apply(&self.s, &a, &self.history[self.history_len])
+        else:
+            state_apply(&self.s, NULL, &self.history[self.history_len])
+        self.history_len += 1
+
+    cpdef undo_action(self):
+        if self.history_len == 0:
+            raise IndexError("No action to undo")
+        self.history_len -= 1
+        state_undo(&self.s, &self.history[self.history_len])
+
     cpdef tuple get_infoset_key(self): # ИСПРАВЛЕНО: def -> cpdef
-        player_board = self.boards[self.current_player].to_int_tuple()
-        opponent_board = self.boards[(self.current_player + 1) % self.players].to_int_tuple()
-        my_discards = tuple(sorted(self.discards[self.current_player]))
-        dealt = tuple(sorted(self.dealt_cards)) if self.dealt_cards else tuple()
-        
-        return (self.street, self.current_player, player_board, opponent_board, dealt, my_discards)
+        """Канонический ключ (state_infoset_words): улица, игрок и маски карт по группам."""
+        cdef uint64_t words[INFOSET_KEY_WORDS]
+        cdef int i
+        state_infoset_words(&self.s, words)
+        return tuple([words[i] for i in range(INFOSET_KEY_WORDS)])
+
+    cpdef tuple canonical_suit_map(self):
+        """Каноническая масть для каждой масти в порядке s, h, d, c."""
+        cdef uint8_t perm[NUM_SUITS]
+        cdef int i
+        state_canonical_suits(&self.s, perm)
+        return tuple([perm[i] for i in range(NUM_SUITS)])
+
+    cpdef uint64_t get_infoset_hash(self):
+        """hash_infoset_key(get_infoset_key()) без построения кортежа."""
+        return state_infoset_hash(&self.s)
+
+    cpdef dict to_dict(self):
+        """Состояние из простых типов (для JSON): доски по 13 слотов (0 — пусто), сбросы, раздача, колода."""
+        return {
+            'street': self.s.street, 'dealer': self.s.dealer, 'current_player': self.s.current_player,
+            'is_terminal': bool(self.s.is_terminal),
+            'boards': [[self.s.cards[p][i] for i in range(BOARD_SLOTS)] for p in range(NUM_PLAYERS)],
+            'discards': self.discards, 'dealt': self.dealt_cards,
+            'deck': [self.s.deck[i] for i in range(self.s.deck_pos, DECK_SIZE)],
+            'rng': self.s.rng,
+        }
+
+    @staticmethod
+    def from_dict(dict d):
+        """
+        Обратное к to_dict. Без 'deck' колодой считаются все не встреченные карты; без 'rng' — новый сид.
+        Поля проверяются: некорректный словарь (в том числе из сети) даёт ValueError.
+        """
+        cdef GameState g = GameState(seed=0)   # явный сид не расходует ГСЧ раздач
+        cdef CGameState* s = &g.s
+        cdef int p, i, row
+        cdef uint64_t seen = 0, used = 0, bit
+        if len(d['boards']) != NUM_PLAYERS or len(d['discards']) != NUM_PLAYERS:
+            raise ValueError(f"Expected {NUM_PLAYERS} boards and discard lists")
+        if not 1 <= d['street'] <= LAST_STREET + 1:
+            raise ValueError(f"Invalid street: {d['street']}")
+        if d['dealer'] not in range(NUM_PLAYERS) or d['current_player'] not in range(NUM_PLAYERS):
+            raise ValueError("Invalid dealer or current_player")
+        cards = [c for board in d['boards'] for c in board if c] + [c for x in d['discards'] for c in x] + list(d['dealt'])
+        if d.get('deck') is not None:
+            if len(d['deck']) > DECK_SIZE:
+                raise ValueError("Too many cards in deck")
+            cards += d['deck']
+        for c in cards:
+            if c not in card.FULL_DECK_CARDS:
+                raise ValueError(f"Invalid card: {c!r}")
+            # Каждая карта встречается один раз: на досках, в сбросах, в раздаче и в колоде вместе
+            bit = (<uint64_t>1) << card_index(c)
+            if used & bit:
+                raise ValueError(f"Duplicate card: {card.Card.to_str(c)}")
+            used |= bit
+        memset(s, 0, sizeof(CGameState))
+        s.street = d['street']
+        s.dealer = d['dealer']
+        s.current_player = d['current_player']
+        s.is_terminal = d.get('is_terminal', False)
+        s.rng = d.get('rng') or rng_next(&_seed_rng)
+        for p in range(NUM_PLAYERS):
+            board = d['boards'][p]
+            if len(board) != BOARD_SLOTS:
+                raise ValueError(f"Board must have {BOARD_SLOTS} slots")
+            for i in range(BOARD_SLOTS):
+                if board[i]:
+                    row = SLOT_ROW[i]
+                    s.cards[p][i] = board[i]
+                    s.row_mask[p][row] |= (<uint64_t>1) << card_index(board[i])
+                    s.row_count[p][row] += 1
+                    seen |= (<uint64_t>1) << card_index(board[i])
+            discards = d['discards'][p]
+            if len(discards) > MAX_DISCARDS:
+                raise ValueError("Too many discards")
+            for i, c in enumerate(discards):
+                s.discards[p][i] = c
+                seen |= (<uint64_t>1) << card_index(c)
+            s.num_discards[p] = len(discards)
+        if len(d['dealt']) > MAX_DEALT:
+            raise ValueError("Too many dealt cards")
+        for i, c in enumerate(d['dealt']):
+            s.dealt[i] = c
+            seen |= (<uint64_t>1) << card_index(c)
+        s.num_dealt = len(d['dealt'])
+        deck = d.get('deck')
+        if deck is None:
+            deck = [CARD_BY_INDEX[i] for i in range(DECK_SIZE) if not (seen >> i) & 1]
+        s.deck_pos = DECK_SIZE - len(deck)
+        for i, c in enumerate(deck):
+            s.deck[s.deck_pos + i] = c
+        return g
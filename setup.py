@@ -1,9 +1,17 @@
 # mccfr_engine/setup.py
-from setuptools import setup
+# OFC_INSTRUMENT=1 python setup.py build_ext --inplace --force — сборка со счётчиками
+# по улицам, таймерами фаз и node hook в mccfr (см. mccfr.instrument_stats).
+import os
+from glob import glob
+
+from setuptools import Extension, setup
 from Cython.Build import cythonize
 import numpy
 
+macros = [('OFC_INSTRUMENT', '1')] if os.environ.get('OFC_INSTRUMENT', '0') not in ('', '0') else []
+
 setup(
-    ext_modules=cythonize(["*.pyx"]),
+    ext_modules=cythonize([Extension(os.path.splitext(path)[0], [path], define_macros=macros)
+                           for path in sorted(glob("*.pyx"))]),
     include_dirs=[numpy.get_include()]
 )
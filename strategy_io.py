@@ -0,0 +1,194 @@
+# mccfr_engine/strategy_io.py
+"""
+Бинарный формат средней стратегии для MCCFREngine.
+
+Файл (little-endian), секции выровнены на страницу:
+  заголовок  64 байта: MAGIC, версия, число инфосетов, число float, смещения секций
+  keys       uint64[count]     — отсортированные хеши hash_infoset_key
+  offsets    uint64[count + 1] — начало стратегии инфосета i в blob; offsets[count] == floats
+  blob       float32[floats]   — нормированная средняя стратегия (сумма по инфосету = 1)
+
+StrategyIndex — тот же индекс в памяти (build_index нормирует pickle-профиль один раз).
+MappedStrategy открывает файл через mmap только на чтение: загрузка не читает данные,
+страницы подгружаются по требованию и разделяются между процессами (в т.ч. форкнутыми).
+Поиск — бинарный по keys. Старые pickle-профили загружаются через load_strategy как раньше
+и переводятся в этот формат convert_pickle.
+"""
+import argparse
+import mmap
+import os
+import pickle
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from infoset_table import InfosetTable, hash_infoset_key
+
+MAGIC = b'OFCSTRAT'
+FORMAT_VERSION = 1
+ALIGNMENT = 4096
+HEADER = struct.Struct('<8sIIQQQQQ')   # magic, version, reserved, count, floats, keys/offsets/blob offsets
+HEADER_SIZE = 64
+
+def _align(n: int) -> int:
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _gather_segments(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Индексы, собирающие отрезки [starts[i], starts[i] + counts[i]) подряд
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    return np.repeat(starts - bounds[:-1], counts) + np.arange(bounds[-1])
+
+def _profile_arrays(profile) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (хеши ключей, число действий, strategy_sum подряд в порядке ключей)
+    if isinstance(profile, InfosetTable):
+        keys, metas, arena = profile.to_arrays()
+        counts = (metas & np.uint64(0xFFFF)).astype(np.int64)
+        starts = (metas >> np.uint64(16)).astype(np.int64) + counts   # strategy_sum идёт после regret_sum
+        return keys, counts, arena[_gather_segments(starts, counts)]
+    keys, counts, sums = [], [], []
+    for key, node in profile.items():
+        strategy = np.asarray(node['strategy_sum'], dtype=np.float32)
+        keys.append(hash_infoset_key(key))
+        counts.append(len(strategy))
+        sums.append(strategy)
+    return (np.array(keys, dtype=np.uint64), np.array(counts, dtype=np.int64),
+            np.concatenate(sums) if sums else np.empty(0, dtype=np.float32))
+
+class StrategyIndex:
+    """
+    Нормированная средняя стратегия: отсортированные хеши ключей, offsets и blob.
+    Ключ — кортеж инфосета или готовый хеш (int); get(key) возвращает float32-вид без копирования.
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, blob: np.ndarray):
+        self.keys = keys
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        """Позиции хешей в индексе (int64), -1 для отсутствующих."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        pos = np.searchsorted(self.keys, hashes)
+        found = pos < len(self.keys)
+        found[found] = self.keys[pos[found]] == hashes[found]
+        return np.where(found, pos, -1)
+
+    def _find(self, key) -> int:
+        return int(self.find_hashes([hash_infoset_key(key)])[0])
+
+    def strategy_at(self, i: int) -> np.ndarray:
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])]
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        return self.strategy_at(i) if i >= 0 else default
+
+    def __getitem__(self, key):
+        strategy = self.get(key)
+        if strategy is None:
+            raise KeyError(key)
+        return strategy
+
+def build_index(profile) -> StrategyIndex:
+    """
+    Нормирует среднюю стратегию profile (InfosetTable или dict ключ -> {'strategy_sum': ...})
+    и строит StrategyIndex в памяти.
+    """
+    keys, counts, sums = _profile_arrays(profile)
+    if np.any(counts <= 0):
+        raise ValueError("Infoset without actions in profile")
+
+    # Нормировка: стратегия = strategy_sum / сумма, равномерная при нулевой сумме
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    totals = np.add.reduceat(sums.astype(np.float64), bounds[:-1]) if len(keys) else np.empty(0)
+    per_action = np.repeat(totals, counts)
+    uniform = np.repeat(1.0 / np.maximum(counts, 1), counts)
+    safe = np.where(per_action > 0, per_action, 1.0)
+    normalized = np.where(per_action > 0, sums / safe, uniform)
+
+    # Сортировка по хешу: blob идёт в том же порядке, offsets монотонны
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    if np.any(keys[1:] == keys[:-1]):
+        raise ValueError("Duplicate infoset key hashes in profile")
+    blob = normalized[_gather_segments(bounds[:-1][order], counts[order])].astype('<f4')
+    offsets = np.concatenate(([0], np.cumsum(counts[order]))).astype('<u8')
+    return StrategyIndex(keys.astype('<u8'), offsets, blob)
+
+def export_strategy(profile, path: str) -> int:
+    """
+    Записывает profile (StrategyIndex, InfosetTable или dict) в бинарный формат. Возвращает число инфосетов.
+    Файл пишется рядом и переименовывается: открытые через mmap старые версии остаются целыми.
+    """
+    index = profile if isinstance(profile, StrategyIndex) else build_index(profile)
+    count, floats = len(index.keys), len(index.blob)
+    keys_offset = _align(HEADER_SIZE)
+    offsets_offset = _align(keys_offset + 8 * count)
+    blob_offset = _align(offsets_offset + 8 * (count + 1))
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, floats, keys_offset, offsets_offset, blob_offset))
+        for offset, array in ((keys_offset, index.keys), (offsets_offset, index.offsets), (blob_offset, index.blob)):
+            f.write(b'\0' * (offset - f.tell()))
+            array.tofile(f)
+    os.replace(path + '.tmp', path)
+    return count
+
+class MappedStrategy(StrategyIndex):
+    """StrategyIndex поверх бинарного файла, отображённого через mmap только на чтение."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, floats, keys_offset, offsets_offset, blob_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a strategy file: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported strategy format version {version} in {path}")
+        self.path = path
+        super().__init__(np.frombuffer(self._mmap, dtype='<u8', count=count, offset=keys_offset),
+                         np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=offsets_offset),
+                         np.frombuffer(self._mmap, dtype='<f4', count=floats, offset=blob_offset))
+
+    def close(self) -> None:
+        self.keys = self.offsets = self.blob = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_strategy_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def load_strategy(path: str):
+    """MappedStrategy для бинарного файла, иначе — объект из pickle (InfosetTable или dict)."""
+    if is_strategy_file(path):
+        return MappedStrategy(path)
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def convert_pickle(src: str, dst: str) -> int:
+    """Переводит pickle-профиль в бинарный формат; возвращает число инфосетов."""
+    with open(src, 'rb') as f:
+        profile = pickle.load(f)
+    return export_strategy(profile, dst)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Конвертирует pickle-профиль стратегии в бинарный mmap-формат")
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    args = parser.parse_args(argv)
+    print(f"Записано инфосетов: {convert_pickle(args.src, args.dst)} -> {args.dst}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# mccfr_engine/test_action_server.py
+"""
+Разбор запросов сервера действий: GameState.from_dict отвергает некорректные состояния
+(в том числе с повторяющимися картами), а сервер отвечает на такой запрос ошибкой и
+продолжает обслуживать соединение.
+"""
+import asyncio
+import copy
+import json
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import mccfr
+from action_server import ActionServer
+from engine_api import MCCFREngine
+from infoset_table import InfosetTable
+from ofc_game import GameState
+from strategy_io import export_strategy
+
+def decision_state() -> dict:
+    """Словарь состояния второй улицы: на доске игрока есть карты, в раздаче — три."""
+    state = GameState(seed=5)
+    state.apply_action_inplace(state.get_legal_action_codes()[0])
+    while state.current_player != 0 or not state.get_legal_action_codes():
+        codes = state.get_legal_action_codes()
+        state.apply_action_inplace(codes[0] if codes else None)
+    return state.to_dict()
+
+def first_card(board) -> int:
+    return next(c for c in board if c)
+
+def test_from_dict_round_trip():
+    d = decision_state()
+    assert GameState.from_dict(d).to_dict() == d
+
+@pytest.mark.parametrize('mutate', [
+    lambda d: d.update(dealt=[d['dealt'][0]] * len(d['dealt'])),                     # повтор в раздаче
+    lambda d: d.update(dealt=[first_card(d['boards'][0])] + d['dealt'][1:]),          # раздача и доска
+    lambda d: d['boards'][1].__setitem__(12, first_card(d['boards'][0])),             # две доски
+    lambda d: d.update(deck=d['deck'][:-1] + [d['dealt'][0]]),                        # колода и раздача
+], ids=['dealt', 'dealt-board', 'boards', 'deck'])
+def test_from_dict_rejects_duplicate_cards(mutate):
+    d = copy.deepcopy(decision_state())
+    mutate(d)
+    with pytest.raises(ValueError, match="Duplicate card"):
+        GameState.from_dict(d)
+
+@pytest.fixture
+def server_path(tmp_path):
+    table = InfosetTable()
+    mccfr.run_iterations(table, 50, 'outcome')
+    strategy = str(tmp_path / 'strategy.bin')
+    export_strategy(table, strategy)
+    path = str(tmp_path / 'actions.sock')
+    server = ActionServer(MCCFREngine(strategy))
+    threading.Thread(target=lambda: asyncio.run(server.serve(path)), daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "server did not start"
+        time.sleep(0.01)
+    return path
+
+def test_server_answers_duplicate_card_with_error(server_path):
+    good = decision_state()
+    bad = copy.deepcopy(good)
+    bad['dealt'] = [bad['dealt'][0]] * len(bad['dealt'])
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server_path)
+        f = sock.makefile('rwb')
+        for i, state in enumerate((bad, good)):
+            f.write(json.dumps({'id': i, 'state': state}).encode() + b'\n')
+        f.flush()
+        replies = {r['id']: r for r in (json.loads(f.readline()) for _ in range(2))}
+    assert 'Duplicate card' in replies[0]['error']
+    assert replies[1]['action'] is not None
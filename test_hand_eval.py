@@ -0,0 +1,59 @@
+# mccfr_engine/test_hand_eval.py
+"""
+Сверка нативного hand_eval с эталонным evaluator.py (get_hand_rank / get_row_royalty)
+на всех руках: 22 100 трёхкарточных в каждом ряду и 2 598 960 пятикарточных в среднем
+и нижнем рядах — и поштучно (evaluate), и векторно (evaluate_batch).
+"""
+import itertools
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+import evaluator
+import hand_eval
+from card import FULL_DECK_CARDS, Card
+
+DECK = np.array(sorted(FULL_DECK_CARDS), dtype=np.int32)
+CASES = [(3, row) for row in evaluator.ROW_NAMES] + [(5, 'middle'), (5, 'bottom')]
+
+@lru_cache(maxsize=None)
+def all_hands(size: int) -> np.ndarray:
+    """Все сочетания size карт колоды, массив (N, size) в формате card.py."""
+    combos = itertools.chain.from_iterable(itertools.combinations(range(len(DECK)), size))
+    return DECK[np.fromiter(combos, dtype=np.int8).reshape(-1, size)]
+
+@lru_cache(maxsize=None)
+def reference_ranks(size: int) -> np.ndarray:
+    # (ранг, класс) не зависят от ряда: эталон считается один раз на размер руки
+    return np.array([evaluator.get_hand_rank(hand)[:2] for hand in all_hands(size).tolist()], dtype=np.int32)
+
+@lru_cache(maxsize=None)
+def reference(size: int, row: str) -> np.ndarray:
+    """Эталонные (ранг, класс, роялти) всех рук размера size в ряду row, массив (N, 3)."""
+    royalties = [evaluator.get_row_royalty(hand, row) for hand in all_hands(size).tolist()]
+    return np.column_stack([reference_ranks(size), np.array(royalties, dtype=np.int32)])
+
+def _assert_same(size: int, row: str, actual: np.ndarray) -> None:
+    expected = reference(size, row)
+    bad = np.flatnonzero((actual != expected).any(axis=1))
+    if len(bad):
+        i = bad[0]
+        hand = ' '.join(Card.to_str(int(c)) for c in all_hands(size)[i])
+        pytest.fail(f"{len(bad)} mismatches in {row}; first: {hand} -> "
+                    f"{tuple(actual[i])}, expected {tuple(expected[i])}")
+
+@pytest.mark.parametrize('size,row', CASES)
+def test_evaluate_matches_reference(size, row):
+    actual = np.array([hand_eval.evaluate(hand, row) for hand in all_hands(size).tolist()], dtype=np.int32)
+    _assert_same(size, row, actual)
+
+@pytest.mark.parametrize('size,row', CASES)
+def test_evaluate_batch_matches_reference(size, row):
+    _assert_same(size, row, np.column_stack(hand_eval.evaluate_batch(all_hands(size), row)))
+
+def test_evaluate_batch_rejects_bad_input():
+    with pytest.raises(ValueError):
+        hand_eval.evaluate_batch(np.zeros((2, 4), dtype=np.int32))
+    with pytest.raises(ValueError):
+        hand_eval.evaluate_batch(all_hands(3)[:2], 'side')
@@ -0,0 +1,277 @@
+# mccfr_engine/trainer.py
+"""
+Многопроцессный тренер MCCFR.
+
+N процессов-воркеров (fork) обходят собственные раздачи и пишут в одну InfosetTable
+в разделяемой памяти (атомарные float-сложения, без блокировок). Каждый воркер
+получает свой сид из SeedSequence(master_seed): раздачи воркера воспроизводимы при тех же
+seed и числе воркеров. Сэмплирование действий зависит от текущей стратегии в общей таблице,
+которую одновременно меняют другие воркеры в порядке, заданном планировщиком ОС, поэтому
+траектории и таблица побитно воспроизводимы только при одном воркере.
+
+Разделяемая таблица не растёт. Когда она заполнена, новые инфосеты не сохраняются, а
+известные продолжают обучаться; тренер предупреждает об этом и считает отказы (TrainStats.rejected).
+"""
+import argparse
+import multiprocessing as mp
+import os
+import pickle
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+import mccfr
+import ofc_game
+from checkpoint import DEFAULT_COMPACT_AFTER, CheckpointStore
+from evaluate import format_result, head_to_head
+from infoset_table import InfosetTable
+from strategy_io import export_strategy
+
+# Размеры таблицы. Узел занимает ячейку индекса (заполняется до 70%) и 2 float на действие в арене.
+# Outcome sampling (режим по умолчанию) добавляет ~9 инфосетов за итерацию, ~120 float каждый:
+# индекс и арена по умолчанию заполняются примерно через 250 тыс. итераций. External sampling
+# добавляет 2.1-2.7 млн инфосетов за итерацию, ~17 float каждый. Для N инфосетов нужны
+# --capacity >= N / 0.7 и --arena-floats >= N * (float на инфосет).
+DEFAULT_MODE = 'outcome'
+DEFAULT_CAPACITY = 1 << 22        # ячеек индекса (~2.9 млн инфосетов)
+DEFAULT_ARENA_FLOATS = 1 << 28    # float32 в арене (1 ГБ, ~2.2 млн инфосетов outcome sampling)
+PROGRESS_BATCH = {'full': 1, 'external': 1, 'outcome': 16}   # итераций между обновлениями прогресса
+DEFAULT_DISCOUNT_INTERVAL = 1000  # итераций на шаг дисконтирования Linear/DCFR/CFR+
+EVAL_STRATEGY = 'strategy.bin'    # стратегия для оценки в каталоге чекпоинта
+
+@dataclass
+class TrainStats:
+    iterations: int
+    seconds: float
+    iterations_per_sec: float
+    infosets: int
+    rejected: int   # узлы, не поместившиеся в таблицу
+
+@dataclass
+class WorkerState:
+    deal_state: int        # ГСЧ раздач (ofc_game)
+    sampler_state: int     # ГСЧ сэмплирования (mccfr)
+    iterations: int = 0    # выполнено итераций; задаёт чередование обновляемого игрока
+
+def worker_seeds(master_seed: int, workers: int) -> List[Tuple[int, int]]:
+    """
+    (сид раздач, сид сэмплирования) каждого воркера, определяемые master_seed и числом воркеров.
+    Оба ГСЧ — один и тот же xorshift64*: с равными сидами сэмплирование повторяло бы поток раздач.
+    """
+    children = np.random.SeedSequence(master_seed).spawn(workers)
+    return [tuple(int(x) for x in c.generate_state(2, dtype=np.uint64)) for c in children]
+
+def split_iterations(iterations: int, workers: int) -> List[int]:
+    return [iterations // workers + (1 if w < iterations % workers else 0) for w in range(workers)]
+
+def _worker_main(worker_id: int, state: WorkerState, table: InfosetTable, iterations: int, mode: str,
+                 batch: int, progress, rng_out) -> None:
+    ofc_game.set_deal_state(state.deal_state)
+    mccfr.set_sampler_state(state.sampler_state)
+    done = 0
+    while done < iterations:
+        n = min(batch, iterations - done)
+        mccfr.run_iterations(table, n, mode, state.iterations + done)
+        done += n
+        progress[worker_id] = done
+    rng_out[2 * worker_id] = ofc_game.get_deal_state()
+    rng_out[2 * worker_id + 1] = mccfr.get_sampler_state()
+
+class ParallelTrainer:
+    def __init__(self, workers: Optional[int] = None, seed: int = 0, mode: str = DEFAULT_MODE,
+                 capacity: int = DEFAULT_CAPACITY, arena_floats: int = DEFAULT_ARENA_FLOATS,
+                 checkpoint_dir: Optional[str] = None, rule: str = 'vanilla', pruning: bool = False,
+                 discount_interval: int = DEFAULT_DISCOUNT_INTERVAL):
+        if mode not in mccfr.SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {mode}")
+        if discount_interval < 1:
+            raise ValueError("discount_interval must be >= 1")
+        store = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        if store is not None and store.manifest() is not None:
+            # Проверка до configure_updates и выделения таблицы: отказ не меняет глобальные
+            # правила обновления и не занимает память, а инкремент поверх чужого манифеста испортил бы чекпоинт
+            raise FileExistsError(f"{checkpoint_dir} already has a checkpoint; resume it or use another directory")
+        mccfr.configure_updates(rule, pruning=pruning)
+        self.discount_interval = discount_interval
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.mode = mode
+        self.capacity = capacity
+        self.arena_floats = arena_floats
+        self.table = InfosetTable(capacity=capacity, arena_capacity=arena_floats, shared=True)
+        self.iteration = 0
+        self.worker_states = [WorkerState(deal, sampler) for deal, sampler in worker_seeds(seed, self.workers)]
+        self.store = store
+        self._discounts: List[tuple] = []   # шаги дисконтирования с прошлого чекпоинта
+        self._ctx = mp.get_context('fork')
+
+    @classmethod
+    def resume(cls, checkpoint_dir: str) -> 'ParallelTrainer':
+        """Восстанавливает тренер из последнего чекпоинта: таблицу, счётчик итераций и ГСЧ воркеров."""
+        store = CheckpointStore(checkpoint_dir)
+        manifest = store.manifest()
+        if manifest is None:
+            raise FileNotFoundError(f"No checkpoint in {checkpoint_dir}")
+        state = manifest['state']
+        trainer = cls(len(state['workers']), state['seed'], state['mode'], state['capacity'],
+                      state['arena_floats'], discount_interval=state.get('discount_interval', DEFAULT_DISCOUNT_INTERVAL))
+        mccfr.configure_updates(**state.get('updates', {}))
+        store.load(trainer.table)
+        trainer.store = store
+        trainer.iteration = state['iteration']
+        trainer.worker_states = [WorkerState(**w) for w in state['workers']]
+        return trainer
+
+    def _state(self) -> dict:
+        return {'iteration': self.iteration, 'seed': self.seed, 'mode': self.mode,
+                'capacity': self.capacity, 'arena_floats': self.arena_floats,
+                'updates': mccfr.update_config(), 'discount_interval': self.discount_interval,
+                'workers': [asdict(w) for w in self.worker_states]}
+
+    def checkpoint(self, full: bool = False, compact_after: int = DEFAULT_COMPACT_AFTER) -> None:
+        """Пишет чекпоинт в checkpoint_dir; после compact_after инкрементов сливает их в снимок."""
+        if self.store is None:
+            raise ValueError("Trainer has no checkpoint_dir")
+        self.store.save(self.table, self._state(), full, self._discounts)
+        self._discounts = []
+        if compact_after and self.store.deltas >= compact_after:
+            self.store.compact()
+
+    def _run_round(self, iterations: int, report_interval: float, batch: int, total: int,
+                   start: float, done_before: int) -> None:
+        shares = split_iterations(iterations, self.workers)
+        progress = self._ctx.Array('q', self.workers, lock=False)
+        rng_out = self._ctx.Array('Q', 2 * self.workers, lock=False)
+        procs = [self._ctx.Process(target=_worker_main,
+                                   args=(w, self.worker_states[w], self.table, shares[w], self.mode, batch, progress, rng_out),
+                                   daemon=True)
+                 for w in range(self.workers)]
+
+        for p in procs: p.start()
+        last_time = time.perf_counter()
+        while any(p.is_alive() for p in procs):
+            for p in procs: p.join(timeout=report_interval / len(procs))
+            now = time.perf_counter()
+            if now - last_time >= report_interval:
+                # Средняя скорость с начала train(): итерация external sampling длится секунды
+                done = done_before + sum(progress)
+                index_load, arena_load = self.table.load
+                print(f"[{now - start:8.1f}s] итераций: {done}/{total}, {done / (now - start):.2f} it/s, "
+                      f"инфосетов: {len(self.table)}, индекс {index_load:.0%}, арена {arena_load:.0%}")
+                last_time = now
+
+        failed = [w for w, p in enumerate(procs) if p.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Воркеры {failed} завершились с ошибкой")
+        for w, state in enumerate(self.worker_states):
+            state.deal_state = rng_out[2 * w]
+            state.sampler_state = rng_out[2 * w + 1]
+            state.iterations += shares[w]
+        self.iteration += iterations
+
+    def train(self, iterations: int, report_interval: float = 5.0, batch: Optional[int] = None,
+              checkpoint_interval: int = 0, compact_after: int = DEFAULT_COMPACT_AFTER,
+              on_checkpoint: Optional[Callable[['ParallelTrainer'], None]] = None) -> TrainStats:
+        """
+        Выполняет ещё iterations итераций. С checkpoint_dir чекпоинт пишется каждые
+        checkpoint_interval итераций (0 — только в конце), после него вызывается on_checkpoint(self).
+        batch — итераций между обновлениями прогресса (по умолчанию PROGRESS_BATCH режима).
+        """
+        start = time.perf_counter()
+        batch = batch or PROGRESS_BATCH[self.mode]
+        rejected = self.table.rejected
+        discounting = mccfr.discount_factors(1) is not None
+        done = 0
+        while done < iterations:
+            n = iterations - done
+            if self.store is not None and checkpoint_interval > 0:
+                n = min(n, checkpoint_interval - done % checkpoint_interval)
+            if discounting:
+                n = min(n, self.discount_interval - self.iteration % self.discount_interval)
+            self._run_round(n, report_interval, batch, iterations, start, done)
+            done += n
+            if rejected == 0 and self.table.rejected > 0:
+                print(f"Таблица заполнена (индекс {self.table.load[0]:.0%}, арена {self.table.load[1]:.0%}): "
+                      f"новые инфосеты не сохраняются, увеличьте --capacity/--arena-floats")
+            rejected = self.table.rejected
+            if discounting and self.iteration % self.discount_interval == 0:
+                factors = mccfr.apply_discount(self.table, self.iteration // self.discount_interval)
+                if self.store is not None:
+                    self._discounts.append(factors)
+            if self.store is not None and (done == iterations
+                                           or checkpoint_interval > 0 and done % checkpoint_interval == 0):
+                self.checkpoint(compact_after=compact_after)
+                if on_checkpoint is not None:
+                    on_checkpoint(self)
+        elapsed = time.perf_counter() - start
+        return TrainStats(iterations, elapsed, iterations / elapsed if elapsed > 0 else 0.0, len(self.table),
+                          self.table.rejected)
+
+    def save(self, path: str) -> None:
+        """Сохраняет таблицу в формате, который загружает MCCFREngine."""
+        with open(path, 'wb') as f:
+            pickle.dump(self.table, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def export(self, path: str) -> int:
+        """Сохраняет среднюю стратегию в бинарном mmap-формате strategy_io."""
+        return export_strategy(self.table, path)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Параллельное обучение MCCFR для OFC Pineapple")
+    parser.add_argument('--iterations', type=int, required=True)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=mccfr.SAMPLING_MODES, default=DEFAULT_MODE)
+    parser.add_argument('--rule', choices=mccfr.UPDATE_RULES, default='vanilla', help="правило обновления регретов")
+    parser.add_argument('--pruning', action='store_true', help="отсечение действий с сильно отрицательным регретом")
+    parser.add_argument('--discount-interval', type=int, default=DEFAULT_DISCOUNT_INTERVAL,
+                        help="итераций на шаг дисконтирования (cfr+/linear/dcfr)")
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY,
+                        help="ячеек индекса: не меньше инфосетов / 0.7 (external — 2.1-2.7 млн инфосетов за итерацию)")
+    parser.add_argument('--arena-floats', type=int, default=DEFAULT_ARENA_FLOATS,
+                        help="float32 в арене: ~120 на инфосет в outcome, ~17 в external sampling")
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    parser.add_argument('--output', default='strategy.pkl')
+    parser.add_argument('--binary-output', default=None, help="дополнительно записать стратегию в формате strategy_io")
+    parser.add_argument('--checkpoint-dir', default=None, help="каталог инкрементальных чекпоинтов")
+    parser.add_argument('--checkpoint-interval', type=int, default=0, help="итераций между чекпоинтами (0 — только в конце)")
+    parser.add_argument('--compact-after', type=int, default=DEFAULT_COMPACT_AFTER,
+                        help="инкрементов до слияния в полный снимок (0 — не сливать)")
+    parser.add_argument('--resume', action='store_true', help="продолжить обучение из --checkpoint-dir")
+    parser.add_argument('--eval-deals', type=int, default=0, help="раздач матча после каждого чекпоинта (0 — без оценки)")
+    parser.add_argument('--eval-opponent', default='heuristic', help="random, heuristic или файл стратегии")
+    args = parser.parse_args(argv)
+    if args.eval_deals and not args.checkpoint_dir:
+        parser.error("--eval-deals requires --checkpoint-dir")
+
+    def evaluate(trainer: ParallelTrainer) -> None:
+        path = os.path.join(args.checkpoint_dir, EVAL_STRATEGY)
+        trainer.export(path)
+        result = head_to_head(path, args.eval_opponent, args.eval_deals, args.seed, trainer.workers)
+        print(f"[итерация {trainer.iteration}] " + format_result(f"против {args.eval_opponent}", result))
+
+    if args.resume:
+        if not args.checkpoint_dir:
+            parser.error("--resume requires --checkpoint-dir")
+        trainer = ParallelTrainer.resume(args.checkpoint_dir)
+        print(f"Возобновлено с итерации {trainer.iteration}: {len(trainer.table)} инфосетов, {trainer.workers} воркеров")
+    else:
+        try:
+            trainer = ParallelTrainer(args.workers, args.seed, args.mode, args.capacity, args.arena_floats,
+                                      args.checkpoint_dir, args.rule, args.pruning, args.discount_interval)
+        except FileExistsError as e:
+            parser.error(f"{e} (--resume)")
+    stats = trainer.train(args.iterations, args.report_interval,
+                          checkpoint_interval=args.checkpoint_interval, compact_after=args.compact_after,
+                          on_checkpoint=evaluate if args.eval_deals else None)
+    print(f"Готово: {stats.iterations} итераций за {stats.seconds:.1f}s "
+          f"({stats.iterations_per_sec:.1f} it/s, {trainer.workers} воркеров), инфосетов: {stats.infosets}"
+          + (f", не поместилось в таблицу: {stats.rejected}" if stats.rejected else ""))
+    trainer.save(args.output)
+    if args.binary_output:
+        trainer.export(args.binary_output)
+
+if __name__ == '__main__':
+    main()